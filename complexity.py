@@ -0,0 +1,146 @@
+import math
+import random
+import time
+import tracemalloc
+
+# Empirical complexity grading: call a function on inputs of increasing size,
+# time it, and fit the timings against the usual growth classes. A task sets
+#   "complexity": {"input": "sorted_list_missing_target", "sizes": [...],
+#                  "target": "O(log n)", "repeat": 5}
+# and passes when the measured growth is no faster than the target's, give or
+# take EXPONENT_TOLERANCE.
+
+DEFAULT_REPEAT = 5
+CALL_TIME_LIMIT = 0.5  # seconds one call may take before the run counts as too slow
+TRACEMALLOC_SLOWDOWN = 3  # the memory measurement's call may take this much longer
+# Over the usual sizes O(n) and O(n log n) exponents differ by only about 0.1,
+# less than timing noise, so growth this close to the target's still passes
+EXPONENT_TOLERANCE = 0.15
+MIN_SAMPLE_TIME = 0.002  # fast calls are looped until a sample lasts this long
+MAX_LOOPS = 100000
+MIN_FIT_SIZES = 3
+INPUT_SEED = 1234
+
+# Growth classes, cheapest first
+COMPLEXITY_CLASSES = (
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: float(n)),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n^2)", lambda n: float(n * n)),
+)
+CLASS_ORDER = {name: rank for rank, (name, _) in enumerate(COMPLEXITY_CLASSES)}
+
+# Input generators: size and a seeded RNG in, positional arguments out
+INPUT_GENERATORS = {
+    "n": lambda n, rng: (n,),
+    "random_list": lambda n, rng: ([rng.randrange(n * 10) for _ in range(n)],),
+    "sorted_list": lambda n, rng: (list(range(0, 2 * n, 2)),),
+    # The target is odd, so never found: the worst case for a search
+    "sorted_list_missing_target": lambda n, rng: (list(range(0, 2 * n, 2)), 2 * n - 1),
+}
+
+class SizeTimeout(Exception):
+    pass
+
+# Slope of log(y) against log(n): the exponent k in y ~ n^k
+def growth_exponent(sizes, values):
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(max(value, 1e-12)) for value in values]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+# Compare the measured growth exponent with each class's exponent over the
+# same sizes. Working in log-log space ignores constant factors, which depend
+# on the machine. Returns (observed exponent, [(class, distance), ...] best first).
+def fit_complexity(sizes, times):
+    observed = growth_exponent(sizes, times)
+    fits = [
+        (name, abs(observed - growth_exponent(sizes, [growth(n) for n in sizes])))
+        for name, growth in COMPLEXITY_CLASSES
+    ]
+    # Stable sort keeps the cheaper class on ties
+    return observed, sorted(fits, key=lambda fit: fit[1])
+
+# CPU time of this thread, so other processes competing for the CPU don't
+# show up in the timings
+def _sample(function, args, loops):
+    start = time.thread_time()
+    for _ in range(loops):
+        function(*args)
+    return time.thread_time() - start
+
+# Time loops calls, allowing CALL_TIME_LIMIT for each
+def _timed_sample(function, args, loops, timer):
+    with timer(CALL_TIME_LIMIT * loops):
+        return _sample(function, args, loops)
+
+# Best time per call over repeat samples. The same input is reused so every
+# sample runs with warm caches; functions must not modify their arguments.
+def _measure_time(function, args, repeat, timer):
+    loops = 1
+    elapsed = _timed_sample(function, args, loops, timer)
+    while elapsed < MIN_SAMPLE_TIME and loops < MAX_LOOPS:
+        loops = min(loops * 10, MAX_LOOPS)
+        elapsed = _timed_sample(function, args, loops, timer)
+
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        best = min(best, _timed_sample(function, args, loops, timer) / loops)
+    return best
+
+# Peak memory allocated by one call, measured separately since tracemalloc slows allocations
+def _measure_memory(function, args, timer):
+    tracemalloc.start()
+    try:
+        with timer(CALL_TIME_LIMIT * TRACEMALLOC_SLOWDOWN):
+            function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# Whether growth measured as exponent over sizes is within tolerance of target
+def meets_target(sizes, exponent, target, tolerance=EXPONENT_TOLERANCE):
+    growth = dict(COMPLEXITY_CLASSES)[target]
+    return exponent <= growth_exponent(sizes, [growth(n) for n in sizes]) + tolerance
+
+# Measure and grade a function against spec. timer(seconds) is a context
+# manager that raises SizeTimeout when its body runs longer than seconds;
+# each timed sample gets CALL_TIME_LIMIT per call it makes.
+def grade_complexity(function, spec, timer):
+    target = spec["target"]
+    if target not in CLASS_ORDER:
+        raise ValueError(f"Unknown complexity class {target}")
+    generate = INPUT_GENERATORS[spec["input"]]
+    rng = random.Random(INPUT_SEED)
+    repeat = spec.get("repeat", DEFAULT_REPEAT)
+
+    report = {"target": target, "fitted": None, "passed": False, "sizes": []}
+    for n in sorted(spec["sizes"]):
+        args = generate(n, rng)
+        try:
+            seconds = _measure_time(function, args, repeat, timer)
+            peak = _measure_memory(function, args, timer)
+        except SizeTimeout:
+            report["sizes"].append({"n": n, "status": "timeout"})
+            report["reason"] = f"Too slow at n={n:,}"
+            return report
+        report["sizes"].append({"n": n, "status": "ok", "seconds": seconds, "peak_bytes": peak})
+
+    measured = [size for size in report["sizes"] if size["status"] == "ok"]
+    if len(measured) < MIN_FIT_SIZES:
+        report["reason"] = "Not enough sizes to fit a curve"
+        return report
+
+    sizes = [size["n"] for size in measured]
+    exponent, fits = fit_complexity(sizes, [size["seconds"] for size in measured])
+    report["exponent"] = round(exponent, 2)
+    report["fitted"] = fits[0][0]
+    report["passed"] = CLASS_ORDER[report["fitted"]] <= CLASS_ORDER[target] or meets_target(sizes, exponent, target)
+    if not report["passed"]:
+        report["reason"] = f"Grows like {report['fitted']}, expected {target}"
+    return report
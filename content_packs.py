@@ -0,0 +1,143 @@
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+# Content packs live on disk as:
+#   manifest.json  - pack list plus the metadata of every item (what list views need)
+#   <pack>.jsonl   - one JSON object per line holding an item's body, in manifest order
+# Bodies (lesson text, quiz questions, task code) are read on demand from an mmap.
+# Coding tasks whose output depends on randomness or time set "deterministic": false
+# in their body so the app never serves their results from the run cache.
+# Quizzes may set "draw": N to ask N questions drawn from a larger pool.
+# Coding tasks with "function" and "tests" are graded by calling the function
+# once per case ({"name", "args", "kwargs", "expected", "timeout"}) instead of
+# comparing printed output with "validation". "max_steps" gives a task a
+# deterministic budget of executed lines on top of the wall-clock timeout.
+# "complexity" additionally times the function over growing inputs and grades
+# the fitted growth class (see complexity.py).
+
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+MANIFEST_FILE = "manifest.json"
+BODY_CACHE_SIZE = 256
+
+# Fields kept in the manifest; everything else is body
+META_FIELDS = ("id", "type", "category", "title", "premium", "question_count")
+
+# Split a full item into manifest metadata and body
+def split_item(item):
+    meta = {key: item[key] for key in META_FIELDS if key in item}
+    if item["type"] == "quiz":
+        meta["question_count"] = min(item.get("draw") or len(item["questions"]), len(item["questions"]))
+    body = {"id": item["id"]}
+    body.update((key, value) for key, value in item.items() if key not in META_FIELDS)
+    return meta, body
+
+# Write (or replace) one pack and its manifest entry
+def write_content_pack(name, items, directory=CONTENT_DIR):
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    else:
+        manifest = {"version": 1, "packs": []}
+
+    pack = {"name": name, "file": f"{name}.jsonl", "items": []}
+    with open(os.path.join(directory, pack["file"]), "w", encoding="utf-8") as f:
+        for item in items:
+            meta, body = split_item(item)
+            pack["items"].append(meta)
+            f.write(json.dumps(body, ensure_ascii=False) + "\n")
+
+    manifest["packs"] = [p for p in manifest["packs"] if p["name"] != name] + [pack]
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+class _Pack:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.lines = self._index_lines()
+
+    # Line boundaries only; no JSON is parsed until a body is needed
+    def _index_lines(self):
+        lines = []
+        start = 0
+        while start < len(self.data):
+            end = self.data.find(b"\n", start)
+            if end == -1:
+                end = len(self.data)
+            if end > start:
+                lines.append((start, end))
+            start = end + 1
+        return lines
+
+    def read(self, index):
+        start, end = self.lines[index]
+        return json.loads(self.data[start:end])
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+# Metadata for every item in memory, bodies loaded lazily through a bounded LRU
+class ContentStore:
+    def __init__(self, directory=CONTENT_DIR, cache_size=BODY_CACHE_SIZE):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._packs = []
+        self._items = []
+        self._locations = {}
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        for pack_info in manifest["packs"]:
+            pack = _Pack(os.path.join(directory, pack_info["file"]))
+            if len(pack.lines) != len(pack_info["items"]):
+                raise ValueError(f"Content pack {pack_info['name']} does not match its manifest")
+            self._packs.append(pack)
+
+            for index, meta in enumerate(pack_info["items"]):
+                self._items.append(meta)
+                self._locations[(meta["type"], meta["id"])] = (pack, index, meta)
+
+    # Metadata of every item, in manifest order
+    def items(self):
+        return list(self._items)
+
+    # Full item (metadata plus body), or None if unknown
+    def load(self, content_type, item_id):
+        key = (content_type, item_id)
+        with self._lock:
+            if key in self._bodies:
+                self._bodies.move_to_end(key)
+                return self._bodies[key]
+
+        location = self._locations.get(key)
+        if location is None:
+            return None
+
+        pack, index, meta = location
+        body = pack.read(index)
+        if body.get("id") != item_id:
+            raise ValueError(f"Content pack {pack.path} does not match its manifest")
+        item = {**meta, **body}
+
+        with self._lock:
+            self._bodies[key] = item
+            while len(self._bodies) > self.cache_size:
+                self._bodies.popitem(last=False)
+        return item
+
+    def close(self):
+        for pack in self._packs:
+            pack.close()
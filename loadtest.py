@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import atexit
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+# Headless load test: simulated learners drive the real views and handlers
+# through a fake page, without a Flet client attached.
+#
+#   python loadtest.py --learners 200 --rounds 3
+#   python loadtest.py --save-baseline      # record benchmarks/baseline.json
+#
+# The run uses its own database in a temporary directory.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, "benchmarks", "baseline.json")
+REGRESSION_TOLERANCE = 0.25  # p99 may grow this much over the baseline
+HANDLER_THREADS = min(32, (os.cpu_count() or 1) + 4)  # same default as Flet's handler pool
+
+# Stands in for ft.Page: session storage and routing, no client
+class FakeSession:
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value):
+        self._data[key] = value
+
+class FakePage:
+    def __init__(self):
+        self.session = FakeSession()
+        self.route = "/"
+        self.views = []
+        self.on_route_change = None
+        self.on_view_pop = None
+
+    def go(self, route):
+        self.route = route
+        if self.on_route_change:
+            self.on_route_change(SimpleNamespace(route=route))
+
+    def update(self):
+        pass
+
+    def open(self, control):
+        pass
+
+# Every visible control below a view, depth first
+def iter_controls(control):
+    if control.visible is False:
+        return
+    yield control
+    children = []
+    for name in ("controls", "tabs"):
+        children.extend(getattr(control, name, None) or [])
+    for name in ("content", "leading", "title"):
+        child = getattr(control, name, None)
+        if child is not None and not isinstance(child, str):
+            children.append(child)
+    for child in children:
+        yield from iter_controls(child)
+
+def find_control(page, predicate):
+    for control in iter_controls(page.views[-1]):
+        if predicate(control):
+            return control
+    raise LookupError(f"No matching control on {page.route}")
+
+def find_button(page, text):
+    return find_control(page, lambda c: getattr(c, "text", None) == text and getattr(c, "on_click", None))
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+class LoadTest:
+    def __init__(self, app, learners, rounds, think_time):
+        self.app = app
+        self.learners = learners
+        self.rounds = rounds
+        self.think_time = think_time
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.commits = 0
+        self.events = 0
+        self.executor = ThreadPoolExecutor(HANDLER_THREADS)
+
+        self.lesson_ids = [lesson["id"] for lesson in app.CATALOG.all("lesson")]
+        self.quiz_ids = [quiz["id"] for quiz in app.CATALOG.all("quiz")]
+        self.task_ids = [task["id"] for task in app.CATALOG.all("task")]
+
+        # Count write transactions on their way to the cache invalidation hook
+        writer = app.progress_writer
+        on_commit = writer.on_commit
+
+        def count_commit(user_ids):
+            self.commits += 1
+            if on_commit:
+                on_commit(user_ids)
+
+        writer.on_commit = count_commit
+
+        submit = writer.submit
+
+        def count_submit(*args, **kwargs):
+            self.events += 1
+            submit(*args, **kwargs)
+
+        writer.submit = count_submit
+
+    # Time a sync handler on the handler pool, as Flet would run it
+    async def call(self, name, handler, *args):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(self.executor, handler, *args)
+        except Exception:
+            self.errors[name] += 1
+            raise
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+
+    async def call_async(self, name, handler, *args):
+        start = time.perf_counter()
+        try:
+            await handler(*args)
+        except Exception:
+            self.errors[name] += 1
+            raise
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+
+    async def go(self, page, route):
+        await self.call(f"route {self.app.route_pattern(route)}", page.go, route)
+
+    async def think(self, rng):
+        if self.think_time:
+            await asyncio.sleep(rng.random() * self.think_time)
+
+    async def learner(self, index):
+        rng = random.Random(index)
+        page = FakePage()
+        page.session.set("user", self.app.UserSession(index + 1, f"learner{index + 1}").load())
+        # Premium, so every lesson, quiz and task is open to the simulation
+        page.session.get("user").subscription_status = "premium"
+        self.app.main(page)
+
+        for round_number in range(self.rounds):
+            await self.go(page, "/")
+            await self.think(rng)
+
+            await self.go(page, "/lessons")
+            await self.go(page, f"/lessons/{rng.choice(self.lesson_ids)}")
+            button = find_button(page, "Mark as Complete")
+            if not button.disabled:
+                await self.call_async("mark_complete", button.on_click, None)
+            await self.think(rng)
+
+            await self.go(page, "/quizzes")
+            await self.go(page, f"/quizzes/{rng.choice(self.quiz_ids)}")
+            await self.take_quiz(page, rng)
+            await self.think(rng)
+
+            await self.go(page, "/coding")
+            task_id = rng.choice(self.task_ids)
+            await self.go(page, f"/coding/{task_id}")
+            await self.submit_code(page, task_id, f"{index}-{round_number}")
+            await self.think(rng)
+
+    async def take_quiz(self, page, rng):
+        while True:
+            group = find_control(page, lambda c: hasattr(c, "on_change") and type(c).__name__ == "RadioGroup")
+            options = len(group.content.controls)
+            event = SimpleNamespace(control=SimpleNamespace(value=str(rng.randrange(options))))
+            await self.call("quiz select_answer", group.on_change, event)
+
+            button = find_control(page, lambda c: getattr(c, "text", None) in ("Next", "Submit"))
+            submitting = button.text == "Submit"
+            await self.call("quiz next_question", button.on_click, None)
+            if submitting:
+                return
+
+    async def submit_code(self, page, task_id, tag):
+        task = self.app.CATALOG.load("task", task_id)
+        editor = find_control(page, lambda c: type(c).__name__ == "TextField" and not c.read_only)
+        # A unique comment keeps every submission out of the run cache
+        editor.value = f"{task['test_code']}\n# {tag}"
+        await self.call_async("run_code", find_button(page, "Run Code").on_click, None)
+
+    async def run(self):
+        start = time.perf_counter()
+        await asyncio.gather(*(self.learner(i) for i in range(self.learners)))
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.app.progress_writer.flush)
+        elapsed = time.perf_counter() - start
+        self.executor.shutdown()
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        runner = self.app.get_runner()
+        waits = list(runner.wait_times)
+        spawns = list(getattr(runner, "spawn_times", ()))
+        return {
+            "learners": self.learners,
+            "rounds": self.rounds,
+            "elapsed": round(elapsed, 3),
+            "latency": {
+                name: {
+                    "count": len(samples),
+                    "p50": round(percentile(samples, 50) * 1000, 2),
+                    "p99": round(percentile(samples, 99) * 1000, 2),
+                }
+                for name, samples in sorted(self.latencies.items())
+            },
+            "errors": dict(self.errors),
+            "db": {
+                "events": self.events,
+                "transactions": self.commits,
+                "events_per_second": round(self.events / elapsed, 1),
+            },
+            "runner_queue": {
+                "runs": len(waits),
+                "p50": round(percentile(waits, 50) * 1000, 2) if waits else 0,
+                "p99": round(percentile(waits, 99) * 1000, 2) if waits else 0,
+            },
+            "runner_spawn": {
+                "runs": len(spawns),
+                "p50": round(percentile(spawns, 50) * 1000, 2) if spawns else 0,
+                "p99": round(percentile(spawns, 99) * 1000, 2) if spawns else 0,
+            },
+        }
+
+def print_report(report):
+    print(f"{report['learners']} learners x {report['rounds']} rounds in {report['elapsed']}s")
+    print(f"{'':32} {'count':>7} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, stats in report["latency"].items():
+        print(f"{name:32} {stats['count']:>7} {stats['p50']:>10} {stats['p99']:>10}")
+    queue_stats = report["runner_queue"]
+    print(f"{'runner queue wait':32} {queue_stats['runs']:>7} {queue_stats['p50']:>10} {queue_stats['p99']:>10}")
+    spawn_stats = report["runner_spawn"]
+    if spawn_stats["runs"]:
+        print(f"{'runner spawn':32} {spawn_stats['runs']:>7} {spawn_stats['p50']:>10} {spawn_stats['p99']:>10}")
+    db = report["db"]
+    print(f"DB: {db['events']} events in {db['transactions']} transactions, {db['events_per_second']} events/s")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+
+# Latency keys whose p99 got noticeably worse than the baseline
+def find_regressions(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    regressions = []
+    for name, stats in report["latency"].items():
+        base = baseline["latency"].get(name)
+        if base and stats["p99"] > base["p99"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {base['p99']}ms -> {stats['p99']}ms")
+    base_rate = baseline["db"]["events_per_second"]
+    if report["db"]["events_per_second"] < base_rate * (1 - tolerance):
+        regressions.append(f"DB throughput: {base_rate} -> {report['db']['events_per_second']} events/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent learners against the app")
+    parser.add_argument("--learners", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--think-time", type=float, default=0.0, help="max seconds between actions")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--metrics", action="store_true", help="include the app's own metrics in the report")
+    args = parser.parse_args()
+
+    # Fresh database for every run; the app creates data/ under the working directory
+    data_dir = tempfile.mkdtemp(prefix="pygenius-loadtest-")
+    os.chdir(data_dir)
+    # Registered first so it runs after the app has closed its database
+    atexit.register(shutil.rmtree, data_dir, True)
+    sys.path.insert(0, BASE_DIR)
+    import flet as ft
+    import python_master as app
+
+    # No client is attached, so control-level updates have nowhere to go
+    ft.Control.update = lambda self: None
+    # mark_complete is timed as a handler, not including the pause a person
+    # would spend looking at the completed lesson
+    app.LESSON_COMPLETE_DELAY = 0
+    app.get_runner()
+
+    try:
+        report = asyncio.run(LoadTest(app, args.learners, args.rounds, args.think_time).run())
+    finally:
+        app.shutdown_runners()
+    if app.metrics.ENABLED:
+        report["metrics"] = app.metrics.snapshot()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline["learners"], baseline["rounds"]) != (args.learners, args.rounds):
+            print("Baseline was recorded with a different load; not comparing", file=sys.stderr)
+            return 0
+        regressions = find_regressions(report, baseline)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
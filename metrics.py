@@ -0,0 +1,202 @@
+import bisect
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Opt-in latency and counter metrics. Enable with PYGENIUS_METRICS=1 or the
+# --metrics flag; when disabled every hook returns straight away.
+#
+# Exported as JSON from http://127.0.0.1:<PYGENIUS_METRICS_PORT>/metrics, and
+# optionally dumped to PYGENIUS_METRICS_DUMP every PYGENIUS_METRICS_INTERVAL seconds.
+
+ENABLED = os.environ.get("PYGENIUS_METRICS", "") not in ("", "0") or "--metrics" in sys.argv
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("PYGENIUS_METRICS_PORT", "9108") or 0) or None  # empty: no endpoint
+METRICS_DUMP = os.environ.get("PYGENIUS_METRICS_DUMP")
+METRICS_INTERVAL = float(os.environ.get("PYGENIUS_METRICS_INTERVAL", "60"))
+SQL_KEY_LENGTH = 120  # statements are keyed on their first characters
+
+# Upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    # Upper bound of the bucket holding the given percentile
+    def percentile(self, p):
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max
+        return 0.0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "buckets": {
+                str(bound): count
+                for bound, count in zip(BUCKETS_MS + ("inf",), self.counts) if count
+            },
+        }
+
+_histograms = {}  # (name, key) -> Histogram
+_counters = {}  # (name, key) -> int
+_gauges = {}  # name -> callable returning the current value
+_lock = threading.Lock()
+_started = time.time()
+
+def observe(name, key, seconds):
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get((name, key))
+        if histogram is None:
+            histogram = _histograms[(name, key)] = Histogram()
+        histogram.observe(seconds * 1000)
+
+def increment(name, key=None, amount=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[(name, key)] = _counters.get((name, key), 0) + amount
+
+# Value read every time a snapshot is taken
+def gauge(name, read):
+    _gauges[name] = read
+
+@contextmanager
+def _timer(name, key):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, key, time.perf_counter() - start)
+
+@contextmanager
+def _null_timer():
+    yield
+
+def timer(name, key=None):
+    if not ENABLED:
+        return _null_timer()
+    return _timer(name, key)
+
+def snapshot():
+    with _lock:
+        histograms = {}
+        for (name, key), histogram in sorted(_histograms.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            histograms.setdefault(name, {})[str(key)] = histogram.snapshot()
+        counters = {}
+        for (name, key), value in sorted(_counters.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            counters.setdefault(name, {})[str(key)] = value
+
+    gauges = {}
+    for name, read in list(_gauges.items()):
+        try:
+            gauges[name] = read()
+        except Exception as e:
+            gauges[name] = f"error: {e}"
+
+    return {
+        "enabled": ENABLED,
+        "uptime": round(time.time() - _started, 1),
+        "histograms": histograms,
+        "counters": counters,
+        "gauges": gauges,
+    }
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+# Statement text with whitespace collapsed, used as the histogram key
+def sql_key(sql):
+    return " ".join(sql.split())[:SQL_KEY_LENGTH]
+
+# sqlite3 connection and cursor that time every statement; only used while enabled
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        with _timer("sql", sql_key(sql)):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with _timer("sql", sql_key(sql)):
+            return super().executemany(sql, *args)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = json.dumps(snapshot(), indent=2).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def dump(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp_path, path)
+
+def _dump_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            dump(path)
+        except OSError as e:
+            print(f"Metrics: could not write {path}: {e}")
+
+# Start the HTTP endpoint and the periodic dump, if configured; returns the server
+def start_exporter(host=METRICS_HOST, port=METRICS_PORT, dump_path=METRICS_DUMP, interval=METRICS_INTERVAL):
+    if not ENABLED:
+        return None
+
+    server = None
+    if port is not None:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+
+    if dump_path:
+        threading.Thread(target=_dump_loop, args=(dump_path, interval), name="metrics-dump", daemon=True).start()
+    return server
@@ -1,226 +1,898 @@
 import flet as ft
+import asyncio
+import metrics
 import sqlite3
 import os
 import threading
-import sys
-from io import StringIO
-from contextlib import redirect_stdout
 import json
 import time
 import random
+import atexit
+import queue
+import sys
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from content_packs import ContentStore
+from quiz_engine import QuizAttempt, grade_attempt, write_attempt
+from sandbox import (
+    RunCache,
+    compile_code,
+    is_deterministic_result,
+    get_runner,
+    shutdown_runners,
+    run_code_async as sandbox_run_code_async,
+)
 
-# Thread-local storage for database connections
-db_local = threading.local()
+# Database location and connection tuning
+DB_PATH = "data/pythonmaster.db"
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT = 5  # seconds to wait for a lock before failing
+DB_STATEMENT_CACHE = 256  # prepared statements kept per connection
+DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",  # ~8 MB page cache per connection
+    "PRAGMA mmap_size = 67108864",  # 64 MB
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT * 1000}",
+)
 
 # Ensure data directory exists
 if not os.path.exists("data"):
     os.makedirs("data")
 
-# Function to get a thread-local database connection
-def get_db_connection():
-    if not hasattr(db_local, "connection"):
-        db_local.connection = sqlite3.connect("data/pythonmaster.db")
-    return db_local.connection
+# Bounded pool of tuned SQLite connections shared by all threads
+class ConnectionPool:
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE,
+            factory=metrics.TimedConnection if metrics.ENABLED else sqlite3.Connection,
+        )
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        
+        try:
+            return self._idle.get(timeout=DB_BUSY_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+    
+    # Check out a connection; commits on success and rolls back on error.
+    # Writers take the write lock up front so they wait on busy_timeout
+    # instead of failing when a read transaction tries to upgrade.
+    @contextmanager
+    def connection(self, write=False):
+        conn = self._checkout()
+        try:
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+    
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
 
-# Function to get a cursor from the thread-local connection
-def get_cursor():
-    conn = get_db_connection()
-    return conn.cursor()
+db_pool = ConnectionPool(DB_PATH)
+atexit.register(db_pool.close)
 
-# Initialize database
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create tables if they don't exist
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY,
-        username TEXT UNIQUE,
-        progress TEXT,
-        subscription_status TEXT DEFAULT 'free',
-        streak_days INTEGER DEFAULT 0,
-        last_active TEXT,
-        points INTEGER DEFAULT 0
-    )
-    """)
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS completed_lessons (
-        user_id INTEGER,
-        lesson_id TEXT,
-        completed_date TEXT,
-        PRIMARY KEY (user_id, lesson_id)
-    )
-    """)
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS completed_quizzes (
-        user_id INTEGER,
-        quiz_id TEXT,
-        score INTEGER,
-        completed_date TEXT,
-        PRIMARY KEY (user_id, quiz_id)
-    )
-    """)
+# Schema migrations. Each one runs once, in order, and the applied version
+# is recorded in schema_version. Migrations must be safe to re-run if the
+# process dies half-way through.
+MIGRATION_BATCH_SIZE = 1000
+
+def _migrate_initial_tables(pool):
+    with pool.connection(write=True) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            progress TEXT,
+            subscription_status TEXT DEFAULT 'free',
+            streak_days INTEGER DEFAULT 0,
+            last_active TEXT,
+            points INTEGER DEFAULT 0
+        )
+        """)
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS completed_lessons (
+            user_id INTEGER,
+            lesson_id TEXT,
+            completed_date TEXT,
+            PRIMARY KEY (user_id, lesson_id)
+        )
+        """)
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS completed_quizzes (
+            user_id INTEGER,
+            quiz_id TEXT,
+            score INTEGER,
+            completed_date TEXT,
+            PRIMARY KEY (user_id, quiz_id)
+        )
+        """)
+
+def _migrate_completed_tasks_table(pool):
+    with pool.connection(write=True) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS completed_tasks (
+            user_id INTEGER,
+            task_id TEXT,
+            completed_date TEXT,
+            PRIMARY KEY (user_id, task_id)
+        )
+        """)
+        
+        # Covering indexes for the dashboard and list queries
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_completed_lessons_user_date ON completed_lessons (user_id, completed_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_completed_quizzes_user_date ON completed_quizzes (user_id, completed_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_completed_quizzes_quiz_score ON completed_quizzes (quiz_id, score)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_completed_tasks_user_date ON completed_tasks (user_id, completed_date)")
+
+# Coding task completions used to be stored in completed_lessons as
+# "task_{category}_{task_id}". Move them over in small batches so writers
+# are never blocked for long.
+def _migrate_task_completions(pool):
+    task_ids = {f"task_{CATALOG.category_of('task', task['id'])}_{task['id']}": task["id"] for task in CATALOG.all("task")}
+    
+    while True:
+        with pool.connection(write=True) as conn:
+            rows = conn.execute(
+                "SELECT rowid, user_id, lesson_id, completed_date FROM completed_lessons WHERE lesson_id LIKE 'task\\_%' ESCAPE '\\' LIMIT ?",
+                (MIGRATION_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                break
+            
+            conn.executemany(
+                "INSERT OR IGNORE INTO completed_tasks (user_id, task_id, completed_date) VALUES (?, ?, ?)",
+                [(user_id, task_ids.get(key, key.split("_", 2)[-1]), completed_date) for _, user_id, key, completed_date in rows]
+            )
+            conn.executemany("DELETE FROM completed_lessons WHERE rowid = ?", [(row[0],) for row in rows])
+
+# Per-user counters maintained by the progress writer, backfilled once
+def _migrate_user_stats(pool):
+    with pool.connection(write=True) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            lessons_completed INTEGER NOT NULL DEFAULT 0,
+            quizzes_completed INTEGER NOT NULL DEFAULT 0,
+            tasks_completed INTEGER NOT NULL DEFAULT 0,
+            last_activity TEXT
+        )
+        """)
+        
+        cursor.execute("""
+        INSERT OR REPLACE INTO user_stats (user_id, lessons_completed, quizzes_completed, tasks_completed, last_activity)
+        SELECT
+            u.id,
+            (SELECT COUNT(*) FROM completed_lessons WHERE user_id = u.id),
+            (SELECT COUNT(*) FROM completed_quizzes WHERE user_id = u.id),
+            (SELECT COUNT(*) FROM completed_tasks WHERE user_id = u.id),
+            MAX(
+                COALESCE((SELECT MAX(completed_date) FROM completed_lessons WHERE user_id = u.id), ''),
+                COALESCE((SELECT MAX(completed_date) FROM completed_quizzes WHERE user_id = u.id), ''),
+                COALESCE((SELECT MAX(completed_date) FROM completed_tasks WHERE user_id = u.id), '')
+            )
+        FROM users u
+        """)
+        cursor.execute("UPDATE user_stats SET last_activity = NULL WHERE last_activity = ''")
+
+# Append-only log of active days, backfilled from completions; streaks are rebuilt from it
+def _migrate_daily_activity(pool):
+    with pool.connection(write=True) as conn:
+        cursor = conn.cursor()
+        
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(users)")]
+        if "timezone" not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN timezone TEXT")
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_activity (
+            user_id INTEGER,
+            day TEXT,
+            events INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        )
+        """)
+        
+        cursor.execute("""
+        INSERT OR REPLACE INTO daily_activity (user_id, day, events)
+        SELECT user_id, day, COUNT(*) FROM (
+            SELECT user_id, date(completed_date) AS day FROM completed_lessons
+            UNION ALL SELECT user_id, date(completed_date) FROM completed_quizzes
+            UNION ALL SELECT user_id, date(completed_date) FROM completed_tasks
+        )
+        WHERE day IS NOT NULL
+        GROUP BY user_id, day
+        """)
     
-    conn.commit()
+    recompute_streaks(pool)
 
-# Initialize the database in the main thread
-init_db()
+# Quiz attempts with the seed they were drawn from, and one row per answered question
+def _migrate_quiz_attempts(pool):
+    with pool.connection(write=True) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            quiz_id TEXT,
+            seed INTEGER,
+            score INTEGER,
+            correct_count INTEGER,
+            question_count INTEGER,
+            completed_date TEXT
+        )
+        """)
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_responses (
+            attempt_id INTEGER,
+            position INTEGER,
+            question_index INTEGER,
+            answer INTEGER,
+            correct INTEGER,
+            PRIMARY KEY (attempt_id, position)
+        )
+        """)
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_quiz ON quiz_attempts (user_id, quiz_id)")
 
-# Sample content data
-LESSONS = {
-    "beginner": [
-        {"id": "intro", "title": "Python Introduction", "premium": False, 
-         "content": "Python is a high-level, interpreted programming language known for its readability and versatility."},
-        {"id": "first_steps", "title": "First Steps to Coding", "premium": False,
-         "content": "Let's write our first program:\n```python\nprint('Hello, World!')\n```"},
-        {"id": "strings", "title": "Using Quotation Marks in Python Coding", "premium": False,
-         "content": "Strings can be defined with single or double quotes:\n```python\nname = 'Alice'\nmessage = \"Hello, there!\"\n```"},
-        {"id": "data_structures", "title": "Introduction to Basic Data Structures in Python", "premium": False,
-         "content": "Python has several built-in data structures:\n- Lists: `[1, 2, 3]`\n- Dictionaries: `{'a': 1, 'b': 2}`\n- Tuples: `(1, 2, 3)`"},
-        {"id": "variables", "title": "Performing Complex Assignment to Variables", "premium": True,
-         "content": "Python allows complex assignments:\n```python\na, b = 10, 20\nx, y, z = [1, 2, 3]\nfirst, *rest = [1, 2, 3, 4, 5]\n```"}
-    ],
-    "intermediate": [
-        {"id": "functions", "title": "Functions in Python", "premium": True,
-         "content": "Functions allow code reuse and modularization:\n```python\ndef greet(name):\n    return f'Hello, {name}!'\n```"},
-        {"id": "comprehensions", "title": "List Comprehensions", "premium": True,
-         "content": "List comprehensions provide a concise way to create lists:\n```python\nsquares = [x**2 for x in range(10)]\nodd_squares = [x**2 for x in range(10) if x % 2 != 0]\n```"}
-    ],
-    "advanced": [
-        {"id": "decorators", "title": "Python Decorators", "premium": True,
-         "content": "Decorators modify the behavior of functions:\n```python\ndef log_function(func):\n    def wrapper(*args, **kwargs):\n        print(f'Calling {func.__name__}')\n        return func(*args, **kwargs)\n    return wrapper\n\n@log_function\ndef hello():\n    print('Hello')\n```"}
-    ]
-}
+MIGRATIONS = [
+    (1, _migrate_initial_tables),
+    (2, _migrate_completed_tasks_table),
+    (3, _migrate_task_completions),
+    (4, _migrate_user_stats),
+    (5, _migrate_daily_activity),
+    (6, _migrate_quiz_attempts),
+]
 
-QUIZZES = {
-    "beginner": [
-        {
-            "id": "quiz1",
-            "title": "Python Basics Quiz",
-            "premium": False,
-            "questions": [
-                {
-                    "question": "What function is used to output text in Python?",
-                    "options": ["console.log()", "print()", "write()", "output()"],
-                    "correct": 1
-                },
-                {
-                    "question": "Which of these is NOT a basic data type in Python?",
-                    "options": ["Integer", "Array", "String", "Boolean"],
-                    "correct": 1
-                },
-                {
-                    "question": "What symbol is used for comments in Python?",
-                    "options": ["//", "/*", "#", "--"],
-                    "correct": 2
-                }
-            ]
-        },
-        {
-            "id": "quiz2", 
-            "title": "Data Structures Quiz", 
-            "premium": True,
-            "questions": [
-                {
-                    "question": "Which data structure is ordered and mutable?",
-                    "options": ["List", "Tuple", "Set", "Dictionary"],
-                    "correct": 0
-                },
-                {
-                    "question": "Which method adds an element to a list?",
-                    "options": ["push()", "add()", "append()", "insert()"],
-                    "correct": 2
-                }
-            ]
-        }
-    ]
-}
+# Initialize database: bring the schema up to the latest version
+def init_db():
+    with db_pool.connection(write=True) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    current = row[0] or 0
+    
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        migrate(db_pool)
+        with db_pool.connection(write=True) as conn:
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
 
-CODING_TASKS = {
-    "beginner": [
-        {
-            "id": "task1",
-            "title": "Print Even Numbers",
-            "premium": False,
-            "description": "Write a program that prints all even numbers between 1 and 20 using a for loop.",
-            "starter_code": "# Write your code here\n\n",
-            "test_code": "for i in range(1, 21):\n    if i % 2 == 0:\n        print(i)",
-            "validation": "2\n4\n6\n8\n10\n12\n14\n16\n18\n20"
-        },
-        {
-            "id": "task2",
-            "title": "Sum of Numbers",
-            "premium": True,
-            "description": "Write a function that returns the sum of all numbers from 1 to n.",
-            "starter_code": "def sum_to_n(n):\n    # Your code here\n    pass\n\n# Test with\nprint(sum_to_n(10))",
-            "test_code": "def sum_to_n(n):\n    return sum(range(1, n+1))\n\nprint(sum_to_n(10))",
-            "validation": "55"
-        }
-    ],
-    "algorithms": [
-        {
-            "id": "algo1",
-            "title": "Binary Search",
-            "premium": True,
-            "description": "Implement a binary search function that finds the index of a target value in a sorted array.",
-            "starter_code": "def binary_search(arr, target):\n    # Your code here\n    pass\n\n# Test with\narr = [1, 3, 5, 7, 9, 11, 13, 15]\nprint(binary_search(arr, 7))\nprint(binary_search(arr, 8))",
-            "test_code": "def binary_search(arr, target):\n    left, right = 0, len(arr) - 1\n    while left <= right:\n        mid = (left + right) // 2\n        if arr[mid] == target:\n            return mid\n        elif arr[mid] < target:\n            left = mid + 1\n        else:\n            right = mid - 1\n    return -1\n\narr = [1, 3, 5, 7, 9, 11, 13, 15]\nprint(binary_search(arr, 7))\nprint(binary_search(arr, 8))",
-            "validation": "3\n-1"
+# Today's date (YYYY-MM-DD) in a user's timezone; None means server local time
+def local_day(timezone=None):
+    if timezone:
+        try:
+            return datetime.now(ZoneInfo(timezone)).date().isoformat()
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return date.today().isoformat()
+
+# Streak after activity on `day`, given the last active day and current streak
+def next_streak(last_day, streak, day):
+    if not last_day or not streak:
+        return day, 1
+    if day <= last_day:
+        return last_day, streak
+    gap = (date.fromisoformat(day) - date.fromisoformat(last_day)).days
+    return day, streak + 1 if gap == 1 else 1
+
+# A stored streak only counts while the user was active today or yesterday
+def current_streak(last_day, streak, today):
+    if not last_day or (date.fromisoformat(today) - date.fromisoformat(last_day)).days > 1:
+        return 0
+    return streak
+
+# Rebuild every user's streak in one ordered pass over the activity log.
+# Read and rewrite share one write transaction, so progress committed
+# meanwhile on a live database can't be overwritten.
+def recompute_streaks(pool):
+    streaks = {}
+    with pool.connection(write=True) as conn:
+        for user_id, day in conn.execute("SELECT user_id, day FROM daily_activity ORDER BY user_id, day"):
+            last_day, streak = streaks.get(user_id, (None, 0))
+            streaks[user_id] = next_streak(last_day, streak, day)
+        
+        conn.execute("UPDATE users SET streak_days = 0, last_active = NULL")
+        conn.executemany(
+            "UPDATE users SET streak_days = ?, last_active = ? WHERE id = ?",
+            [(streak, last_day, user_id) for user_id, (last_day, streak) in streaks.items()]
+        )
+    return len(streaks)
+
+PROGRESS_FLUSH_INTERVAL = 0.01  # seconds to gather events into one transaction
+PROGRESS_MAX_BATCH = 500
+PROGRESS_CLOSE_TIMEOUT = 10  # seconds to wait for queued events at shutdown
+PROGRESS_DEAD_LETTER = "data/progress_dead_letter.jsonl"  # events that could not be written
+
+# Lock contention clears up on its own; other errors (constraint violations,
+# a read-only or full disk) would fail the same way on every retry
+def is_transient_db_error(e):
+    if not isinstance(e, sqlite3.OperationalError):
+        return False
+    code = getattr(e, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(e).lower()
+    return "locked" in message or "busy" in message or "timed out" in message
+
+# Single background writer for completions and XP. Events are coalesced into
+# grouped transactions; until they are committed, the pending overlay lets
+# readers see their own writes.
+class ProgressWriter:
+    def __init__(self, pool, interval=PROGRESS_FLUSH_INTERVAL, max_batch=PROGRESS_MAX_BATCH, on_commit=None,
+                 dead_letter_path=PROGRESS_DEAD_LETTER):
+        self.pool = pool
+        self.on_commit = on_commit
+        self.dead_letter_path = dead_letter_path
+        self.interval = interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._pending = {}  # (user_id, item_type) -> Counter of item ids
+        self._pending_points = Counter()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+    
+    # item_type is "lesson", "quiz" or "task"; task points are only awarded once.
+    # day is the activity day in the user's timezone. A quiz may carry its
+    # graded attempt as (QuizAttempt, grade), stored in the same transaction.
+    def submit(self, user_id, item_type, item_id, points=0, score=None, day=None, attempt=None):
+        event = (user_id, item_type, item_id, points, score, time.strftime("%Y-%m-%d %H:%M:%S"), day or local_day(), attempt)
+        with self._lock:
+            self._pending.setdefault((user_id, item_type), Counter())[item_id] += 1
+            self._pending_points[user_id] += points
+        self._queue.put(event)
+    
+    # Ids submitted but not yet committed
+    def pending(self, user_id, item_type):
+        with self._lock:
+            return set(self._pending.get((user_id, item_type), ()))
+    
+    def pending_points(self, user_id):
+        with self._lock:
+            return self._pending_points[user_id]
+    
+    # Block until everything submitted so far is committed
+    def flush(self):
+        self._queue.join()
+    
+    # Drain the queue, but never hold up shutdown for longer than timeout
+    def close(self, timeout=PROGRESS_CLOSE_TIMEOUT):
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # Less the stop marker
+            print(f"Progress writer: gave up after {timeout}s, {self._queue.unfinished_tasks - 1} events not written")
+    
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                self._queue.task_done()
+                return
+            
+            batch = [event]
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    event = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if event is None:
+                    stop = True
+                    break
+                batch.append(event)
+            
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+            
+            if stop:
+                self._queue.task_done()
+                return
+    
+    # A batch that fails for good is retried one event at a time, so a bad
+    # event doesn't take the rest of the batch down with it
+    def _write(self, batch):
+        try:
+            self._commit(batch)
+        except sqlite3.Error as e:
+            if len(batch) == 1:
+                self._dead_letter(batch[0], e)
+            else:
+                for event in batch:
+                    try:
+                        self._commit([event])
+                    except sqlite3.Error as e:
+                        self._dead_letter(event, e)
+        
+        # Drop cached reads before the overlay stops covering these events
+        if self.on_commit:
+            self.on_commit({event[0] for event in batch})
+        
+        with self._lock:
+            for user_id, item_type, item_id, points, *_ in batch:
+                pending = self._pending[(user_id, item_type)]
+                pending[item_id] -= 1
+                if pending[item_id] <= 0:
+                    del pending[item_id]
+                self._pending_points[user_id] -= points
+    
+    # Apply a batch in one transaction, retrying while the database is busy
+    def _commit(self, batch):
+        delay = self.interval
+        while True:
+            try:
+                with metrics.timer("progress_write"):
+                    self._apply(batch)
+                return
+            except sqlite3.Error as e:
+                if not is_transient_db_error(e):
+                    raise
+                print(f"Progress writer: {e}, retrying")
+                time.sleep(delay)
+                delay = min(delay * 2, 1)
+    
+    # Drop an event that can't be written, keeping a copy for replay
+    def _dead_letter(self, event, error):
+        print(f"Progress writer: dropped {event[1]} {event[2]} for user {event[0]}: {error}")
+        metrics.increment("progress_dropped", event[1])
+        if not self.dead_letter_path:
+            return
+        
+        record = list(event)
+        if record[-1] is not None:
+            # The seed reproduces the questions, so the answers are enough to replay
+            attempt, _ = record[-1]
+            record[-1] = {"seed": attempt.seed, "answers": attempt.answers}
+        try:
+            with open(self.dead_letter_path, "a") as f:
+                f.write(json.dumps({"event": record, "error": str(error)}) + "\n")
+        except OSError as e:
+            print(f"Progress writer: could not write {self.dead_letter_path}: {e}")
+    
+    def _apply(self, batch):
+        points = Counter()
+        new_rows = {"lesson": Counter(), "quiz": Counter(), "task": Counter()}
+        last_activity = {}
+        
+        with self.pool.connection(write=True) as conn:
+            cursor = conn.cursor()
+            
+            activity = Counter()
+            
+            for user_id, item_type, item_id, award, score, completed_date, day, attempt in batch:
+                if item_type == "lesson":
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO completed_lessons (user_id, lesson_id, completed_date) VALUES (?, ?, ?)",
+                        (user_id, item_id, completed_date)
+                    )
+                    inserted = cursor.rowcount > 0
+                    if not inserted:
+                        cursor.execute(
+                            "UPDATE completed_lessons SET completed_date = ? WHERE user_id = ? AND lesson_id = ?",
+                            (completed_date, user_id, item_id)
+                        )
+                    points[user_id] += award
+                elif item_type == "quiz":
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO completed_quizzes (user_id, quiz_id, score, completed_date) VALUES (?, ?, ?, ?)",
+                        (user_id, item_id, score, completed_date)
+                    )
+                    inserted = cursor.rowcount > 0
+                    if not inserted:
+                        cursor.execute(
+                            "UPDATE completed_quizzes SET score = ?, completed_date = ? WHERE user_id = ? AND quiz_id = ?",
+                            (score, completed_date, user_id, item_id)
+                        )
+                    if attempt is not None:
+                        write_attempt(conn, *attempt, completed_date)
+                    points[user_id] += award
+                else:
+                    # Points only for the first completion
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO completed_tasks (user_id, task_id, completed_date) VALUES (?, ?, ?)",
+                        (user_id, item_id, completed_date)
+                    )
+                    inserted = cursor.rowcount > 0
+                    if inserted:
+                        points[user_id] += award
+                
+                if inserted:
+                    new_rows[item_type][user_id] += 1
+                last_activity[user_id] = completed_date
+                activity[(user_id, day)] += 1
+            
+            cursor.executemany(
+                "UPDATE users SET points = points + ? WHERE id = ?",
+                [(award, user_id) for user_id, award in points.items() if award]
+            )
+            
+            # Activity log plus an O(1) streak step per user and day
+            cursor.executemany(
+                """
+                INSERT INTO daily_activity (user_id, day, events) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, day) DO UPDATE SET events = events + excluded.events
+                """,
+                [(user_id, day, events) for (user_id, day), events in activity.items()]
+            )
+            active_days = {}
+            for user_id, day in activity:
+                active_days.setdefault(user_id, []).append(day)
+            for user_id, days in active_days.items():
+                row = cursor.execute("SELECT last_active, streak_days FROM users WHERE id = ?", (user_id,)).fetchone()
+                if row is None:
+                    continue
+                last_day, streak = row[0], row[1] or 0
+                for day in sorted(days):
+                    last_day, streak = next_streak(last_day, streak, day)
+                cursor.execute(
+                    "UPDATE users SET last_active = ?, streak_days = ? WHERE id = ?",
+                    (last_day, streak, user_id)
+                )
+            
+            # Keep the materialized stats in step with the rows just written
+            cursor.executemany(
+                """
+                INSERT INTO user_stats (user_id, lessons_completed, quizzes_completed, tasks_completed, last_activity)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    lessons_completed = lessons_completed + excluded.lessons_completed,
+                    quizzes_completed = quizzes_completed + excluded.quizzes_completed,
+                    tasks_completed = tasks_completed + excluded.tasks_completed,
+                    last_activity = MAX(COALESCE(last_activity, ''), excluded.last_activity)
+                """,
+                [
+                    (user_id, new_rows["lesson"][user_id], new_rows["quiz"][user_id], new_rows["task"][user_id], last_activity[user_id])
+                    for user_id in last_activity
+                ]
+            )
+
+# Materialized per-user stats, cached in process and invalidated on write
+class UserStatsCache:
+    def __init__(self, pool):
+        self.pool = pool
+        self._stats = {}
+        self._generation = Counter()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id):
+        with self._lock:
+            stats = self._stats.get(user_id)
+            generation = self._generation[user_id]
+        if stats is not None:
+            return stats
+        
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                """
+                SELECT u.points, u.streak_days, s.lessons_completed, s.quizzes_completed, s.tasks_completed, s.last_activity
+                FROM users u LEFT JOIN user_stats s ON s.user_id = u.id
+                WHERE u.id = ?
+                """,
+                (user_id,)
+            ).fetchone() or (0, 0, 0, 0, 0, None)
+        stats = {
+            "points": row[0] or 0,
+            "streak_days": row[1] or 0,
+            "lesson": row[2] or 0,
+            "quiz": row[3] or 0,
+            "task": row[4] or 0,
+            "last_activity": row[5],
         }
-    ]
-}
+        
+        # Only cache if no write landed while we were reading
+        with self._lock:
+            if self._generation[user_id] == generation:
+                self._stats[user_id] = stats
+        return stats
+    
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._stats.pop(user_id, None)
+                self._generation[user_id] += 1
+
+user_stats_cache = UserStatsCache(db_pool)
+
+progress_writer = ProgressWriter(db_pool, on_commit=user_stats_cache.invalidate)
+metrics.gauge("progress_writer_backlog", progress_writer._queue.qsize)
+# Registered after the pool so it drains before connections are closed
+atexit.register(progress_writer.close)
+
+# Content catalog built once at startup: hash index by id plus
+# secondary indexes by category, premium flag and content type.
+# Only metadata is indexed; full items are loaded from the content store on demand.
+class Catalog:
+    def __init__(self, store):
+        self.store = store
+        self._by_id = {}
+        self._category_of = {}
+        self._by_type = {}
+        self._by_category = {}
+        self._by_premium = {}
+    
+    def add(self, content_type, category, item):
+        key = (content_type, item["id"])
+        if key in self._by_id:
+            raise ValueError(f"Duplicate {content_type} id: {item['id']}")
+        
+        self._by_id[key] = item
+        self._category_of[key] = category
+        self._by_type.setdefault(content_type, []).append(item)
+        self._by_category.setdefault((content_type, category), []).append(item)
+        self._by_premium.setdefault((content_type, bool(item["premium"])), []).append(item)
+    
+    def get(self, content_type, item_id):
+        return self._by_id.get((content_type, item_id))
+    
+    # Metadata plus body (lesson text, quiz questions, task code)
+    def load(self, content_type, item_id):
+        if (content_type, item_id) not in self._by_id:
+            return None
+        return self.store.load(content_type, item_id)
+    
+    def category_of(self, content_type, item_id):
+        return self._category_of.get((content_type, item_id))
+    
+    def categories(self, content_type):
+        return [category for (kind, category) in self._by_category if kind == content_type]
+    
+    def by_category(self, content_type, category):
+        return self._by_category.get((content_type, category), [])
+    
+    def by_premium(self, content_type, premium):
+        return self._by_premium.get((content_type, premium), [])
+    
+    def all(self, content_type):
+        return self._by_type.get(content_type, [])
+
+def build_catalog(store):
+    catalog = Catalog(store)
+    for item in store.items():
+        catalog.add(item["type"], item["category"], item)
+    return catalog
 
-# Current user (in a real app, this would come from authentication)
-CURRENT_USER = {
+CATALOG = build_catalog(ContentStore())
+
+# Initialize the database in the main thread
+init_db()
+
+# Demo account (in a real app, this would come from authentication)
+DEFAULT_USER = {
     "id": 1,
     "username": "student1",
     "subscription_status": "free"  # or "premium"
 }
 
-# Function to ensure user exists in the database
-def ensure_user_exists():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id FROM users WHERE id = ?", (CURRENT_USER["id"],))
-    if not cursor.fetchone():
-        cursor.execute(
-            "INSERT INTO users (id, username, subscription_status, progress, points) VALUES (?, ?, ?, ?, ?)",
-            (CURRENT_USER["id"], CURRENT_USER["username"], CURRENT_USER["subscription_status"], "{}", 0)
-        )
-        conn.commit()
+VIEW_CACHE_SIZE = 16  # views kept per session
 
-# Helper function to run Python code safely
-def run_python_code(code, timeout=5):
-    result = {"output": "", "error": None, "timeout": False}
-    
-    # Function to execute in thread
-    def execute():
-        old_stdout = sys.stdout
-        redirected_output = StringIO()
-        sys.stdout = redirected_output
+# Per-session user context, loaded once and kept in memory for the session
+class UserSession:
+    def __init__(self, user_id, username, subscription_status="free"):
+        self.id = user_id
+        self.username = username
+        self.subscription_status = subscription_status
+        self.points = 0
+        self.streak_days = 0
+        self.last_active = None
+        self.timezone = None
+        self.progress = {}
+        self.data_version = 0
+        self._views = OrderedDict()  # route -> (data_version, view)
+    
+    # Load the profile, creating the user on first visit
+    def load(self):
+        with db_pool.connection() as conn:
+            row = conn.execute(
+                "SELECT username, subscription_status, points, streak_days, progress, last_active, timezone FROM users WHERE id = ?",
+                (self.id,)
+            ).fetchone()
         
+        if row:
+            self.username = row[0]
+            self.subscription_status = row[1] or "free"
+            self.points = (row[2] or 0) + progress_writer.pending_points(self.id)
+            self.streak_days = row[3] or 0
+            self.progress = json.loads(row[4] or "{}")
+            self.last_active = row[5]
+            self.timezone = row[6]
+        else:
+            with db_pool.connection(write=True) as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO users (id, username, subscription_status, progress, points) VALUES (?, ?, ?, ?, ?)",
+                    (self.id, self.username, self.subscription_status, "{}", 0)
+                )
+        return self
+    
+    def today(self):
+        return local_day(self.timezone)
+    
+    # Advance the in-memory streak the same way the progress writer will; returns the day
+    def record_activity(self):
+        day = self.today()
+        self.last_active, self.streak_days = next_streak(self.last_active, self.streak_days, day)
+        self.touch()
+        return day
+    
+    # Mark everything this user sees as changed, so cached views get rebuilt
+    def touch(self):
+        self.data_version += 1
+    
+    def cached_view(self, route):
+        cached = self._views.get(route)
+        if cached is None or cached[0] != self.data_version:
+            return None
+        self._views.move_to_end(route)
+        return cached[1]
+    
+    # Whether view is still the current cached view for route
+    def holds_view(self, route, view):
+        cached = self._views.get(route)
+        return cached is not None and cached[1] is view and cached[0] == self.data_version
+    
+    def cache_view(self, route, view):
+        self._views[route] = (self.data_version, view)
+        self._views.move_to_end(route)
+        while len(self._views) > VIEW_CACHE_SIZE:
+            self._views.popitem(last=False)
+    
+    def current_streak(self):
+        return current_streak(self.last_active, self.streak_days, self.today())
+    
+    @property
+    def is_premium(self):
+        return self.subscription_status == "premium"
+    
+    def is_locked(self, item):
+        return item["premium"] and not self.is_premium
+    
+    def set_subscription(self, status):
+        with db_pool.connection(write=True) as conn:
+            conn.execute(
+                "UPDATE users SET subscription_status = ? WHERE id = ?",
+                (status, self.id)
+            )
+        self.subscription_status = status
+        self.touch()
+    
+    # Timezone used for activity days and streaks; None or "" means server local time
+    def set_timezone(self, timezone):
+        timezone = timezone or None
+        if timezone:
+            ZoneInfo(timezone)  # raises for unknown names
+        with db_pool.connection(write=True) as conn:
+            conn.execute(
+                "UPDATE users SET timezone = ? WHERE id = ?",
+                (timezone, self.id)
+            )
+        self.timezone = timezone
+        self.touch()
+
+# User context attached to the page's session
+def get_user_session(page):
+    user = page.session.get("user")
+    if user is None:
+        user = UserSession(DEFAULT_USER["id"], DEFAULT_USER["username"], DEFAULT_USER["subscription_status"]).load()
+        page.session.set("user", user)
+    return user
+
+# Run Python code in the sandbox without blocking the event loop; on_output gets partial output
+async def run_python_code_async(code, timeout=5, on_output=None, tests=None, max_steps=None):
+    return await sandbox_run_code_async(code, timeout, on_output=on_output, tests=tests, max_steps=max_steps)
+
+# Test cases (and complexity grading) of a task in the form the sandbox
+# runs them, or None for tasks graded on their printed output
+def task_tests(task):
+    if not task.get("tests") and not task.get("complexity"):
+        return None
+    return {
+        "function": task["function"],
+        "cases": task.get("tests", []),
+        "fail_fast": task.get("fail_fast", True),
+        "complexity": task.get("complexity"),
+    }
+
+def is_passing(task, result):
+    if result["error"] or result["timeout"]:
+        return False
+    if task_tests(task):
+        cases = result.get("tests") or []
+        if len(cases) != len(task.get("tests", [])) or any(case["status"] != "passed" for case in cases):
+            return False
+        return not task.get("complexity") or result.get("complexity", {}).get("passed", False)
+    return result["output"].strip() == task["validation"].strip()
+
+# Compiled submissions and verdicts shared by all sessions
+RUN_CACHE = RunCache()
+
+# Run and grade a coding task submission, reusing cached bytecode and results.
+# Tasks marked "deterministic": False only reuse the bytecode.
+async def run_task_submission(task, code, on_output=None):
+    key = RUN_CACHE.key(task["id"], code)
+    entry = RUN_CACHE.get(key)
+    deterministic = task.get("deterministic", True)
+    
+    # Code that failed to compile has no bytecode and always fails the same way
+    if entry and entry["result"] is not None and (deterministic or entry["compiled"] is None):
+        metrics.increment("run_cache", "hit")
+        return dict(entry["result"]), entry["passed"]
+    metrics.increment("run_cache", "miss")
+    
+    if entry:
+        compiled = entry["compiled"]
+    else:
+        # Compiling takes a while for large submissions and can run out of
+        # memory or recursion depth on pathological ones, so it happens off
+        # the event loop and any failure is reported like a run error
         try:
-            exec(code)
-            result["output"] = redirected_output.getvalue()
+            compiled = await asyncio.get_running_loop().run_in_executor(None, compile_code, code)
         except Exception as e:
-            result["error"] = str(e)
-        finally:
-            sys.stdout = old_stdout
+            result = {"output": "", "error": str(e) or type(e).__name__, "timeout": False}
+            RUN_CACHE.put(key, None, result, False)
+            return result, False
     
-    # Run with timeout
-    thread = threading.Thread(target=execute)
-    thread.start()
-    thread.join(timeout)
+    result = await run_python_code_async(
+        compiled, on_output=on_output, tests=task_tests(task), max_steps=task.get("max_steps")
+    )
+    passed = is_passing(task, result)
     
-    if thread.is_alive():
-        result["timeout"] = True
-        # In a real app, you'd want to terminate the thread safely
+    if deterministic and is_deterministic_result(result):
+        RUN_CACHE.put(key, compiled, dict(result), passed)
+    elif not entry:
+        RUN_CACHE.put(key, compiled)
     
-    return result
+    return result, passed
 
 # Theme configuration
 def get_theme():
@@ -233,6 +905,22 @@ def get_theme():
         )
     )
 
+# Bottom navigation destinations: route, label, selected icon, unselected icon
+NAV_DESTINATIONS = [
+    ("/", "Home", ft.icons.HOME, ft.icons.HOME_OUTLINED),
+    ("/lessons", "Lessons", ft.icons.MENU_BOOK, ft.icons.MENU_BOOK_OUTLINED),
+    ("/quizzes", "Quizzes", ft.icons.QUIZ, ft.icons.QUIZ_OUTLINED),
+    ("/coding", "Coding", ft.icons.CODE, ft.icons.CODE_OUTLINED),
+    ("/settings", "Settings", ft.icons.SETTINGS, ft.icons.SETTINGS_OUTLINED),
+]
+
+# Highlight one destination; only the icons change, so a mounted bar can be reused
+def select_nav_destination(navbar, selected_index):
+    navbar.data = selected_index
+    for index, (destination, (_, _, icon, unselected_icon)) in enumerate(zip(navbar.destinations, NAV_DESTINATIONS)):
+        destination.content.controls[0].name = icon if index == selected_index else unselected_icon
+        destination.content.controls[0].color = "#4CAF50" if index == selected_index else "#616161"
+
 def get_navbar(page, current_route):
     selected_index = [
         "/" == current_route, 
@@ -242,104 +930,76 @@ def get_navbar(page, current_route):
         "/settings" in current_route
     ].index(True)
     
-    return ft.NavigationBar(
+    navbar = ft.NavigationBar(
         bgcolor="#FFFFFF",
         destinations=[
             ft.Container(
                 content=ft.Column(
                     [
-                        ft.Icon(
-                            ft.icons.HOME if selected_index == 0 else ft.icons.HOME_OUTLINED,
-                            color="#4CAF50" if selected_index == 0 else "#616161",
-                        ),
-                        ft.Text("Home", size=12),
-                    ],
-                    spacing=5,
-                    alignment=ft.MainAxisAlignment.CENTER,
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                ),
-                margin=ft.margin.symmetric(horizontal=8),
-                on_click=lambda _: page.go("/"),
-            ),
-            ft.Container(
-                content=ft.Column(
-                    [
-                        ft.Icon(
-                            ft.icons.MENU_BOOK if selected_index == 1 else ft.icons.MENU_BOOK_OUTLINED,
-                            color="#4CAF50" if selected_index == 1 else "#616161",
-                        ),
-                        ft.Text("Lessons", size=12),
-                    ],
-                    spacing=5,
-                    alignment=ft.MainAxisAlignment.CENTER,
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                ),
-                margin=ft.margin.symmetric(horizontal=8),
-                on_click=lambda _: page.go("/lessons"),
-            ),
-            ft.Container(
-                content=ft.Column(
-                    [
-                        ft.Icon(
-                            ft.icons.QUIZ if selected_index == 2 else ft.icons.QUIZ_OUTLINED,
-                            color="#4CAF50" if selected_index == 2 else "#616161",
-                        ),
-                        ft.Text("Quizzes", size=12),
-                    ],
-                    spacing=5,
-                    alignment=ft.MainAxisAlignment.CENTER,
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                ),
-                margin=ft.margin.symmetric(horizontal=8),
-                on_click=lambda _: page.go("/quizzes"),
-            ),
-            ft.Container(
-                content=ft.Column(
-                    [
-                        ft.Icon(
-                            ft.icons.CODE if selected_index == 3 else ft.icons.CODE_OUTLINED,
-                            color="#4CAF50" if selected_index == 3 else "#616161",
-                        ),
-                        ft.Text("Coding", size=12),
-                    ],
-                    spacing=5,
-                    alignment=ft.MainAxisAlignment.CENTER,
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                ),
-                margin=ft.margin.symmetric(horizontal=8),
-                on_click=lambda _: page.go("/coding"),
-            ),
-            ft.Container(
-                content=ft.Column(
-                    [
-                        ft.Icon(
-                            ft.icons.SETTINGS if selected_index == 4 else ft.icons.SETTINGS_OUTLINED,
-                            color="#4CAF50" if selected_index == 4 else "#616161",
-                        ),
-                        ft.Text("Settings", size=12),
+                        ft.Icon(unselected_icon),
+                        ft.Text(label, size=12),
                     ],
                     spacing=5,
                     alignment=ft.MainAxisAlignment.CENTER,
                     horizontal_alignment=ft.CrossAxisAlignment.CENTER,
                 ),
                 margin=ft.margin.symmetric(horizontal=8),
-                on_click=lambda _: page.go("/settings"),
-            ),
+                on_click=lambda _, route=route: page.go(route),
+            )
+            for route, label, _, unselected_icon in NAV_DESTINATIONS
         ],
     )
+    select_nav_destination(navbar, selected_index)
+    return navbar
 
-# Progress badge for lessons/quizzes
-def get_progress_badge(user_id, item_id, item_type="lesson"):
-    cursor = get_cursor()
-    
-    if item_type == "lesson":
-        cursor.execute("SELECT * FROM completed_lessons WHERE user_id = ? AND lesson_id = ?", 
-                      (user_id, item_id))
-    else:
-        cursor.execute("SELECT * FROM completed_quizzes WHERE user_id = ? AND quiz_id = ?", 
-                      (user_id, item_id))
-    
-    if cursor.fetchone():
+# Completion table and id column for each content type
+COMPLETION_TABLES = {
+    "lesson": ("completed_lessons", "lesson_id"),
+    "quiz": ("completed_quizzes", "quiz_id"),
+    "task": ("completed_tasks", "task_id"),
+}
+
+# Ids a user has completed for one content type, loaded in a single query
+# (plus completions still waiting in the progress writer)
+def get_completion_set(user_id, item_type="lesson"):
+    table, column = COMPLETION_TABLES[item_type]
+    
+    with db_pool.connection() as conn:
+        completed = {row[0] for row in conn.execute(f"SELECT {column} FROM {table} WHERE user_id = ?", (user_id,))}
+    return completed | progress_writer.pending(user_id, item_type)
+
+# Whether one item is completed, including uncommitted completions
+def is_completed(user_id, item_type, item_id):
+    if item_id in progress_writer.pending(user_id, item_type):
+        return True
+    
+    table, column = COMPLETION_TABLES[item_type]
+    with db_pool.connection() as conn:
+        return conn.execute(
+            f"SELECT 1 FROM {table} WHERE user_id = ? AND {column} = ?", (user_id, item_id)
+        ).fetchone() is not None
+
+# Completed counts per content type from the materialized stats, plus
+# completions still waiting in the progress writer
+def get_user_stats(user_id):
+    stats = dict(user_stats_cache.get(user_id))
+    
+    for item_type, (table, column) in COMPLETION_TABLES.items():
+        pending = progress_writer.pending(user_id, item_type)
+        if not pending:
+            continue
+        placeholders = ", ".join("?" * len(pending))
+        with db_pool.connection() as conn:
+            committed = conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE user_id = ? AND {column} IN ({placeholders})",
+                (user_id, *pending)
+            ).fetchone()[0]
+        stats[item_type] += len(pending) - committed
+    return stats
+
+# Progress badge for lessons/quizzes/tasks
+def get_progress_badge(completed):
+    if completed:
         return ft.Icon(ft.icons.CHECK_CIRCLE, color="#4CAF50", size=16)  # GREEN
     else:
         return ft.Container(width=16)  # Empty placeholder
@@ -358,21 +1018,17 @@ def get_premium_badge(is_premium):
 
 # Home Page / Dashboard
 def dashboard_view(page):
-    # Get thread-local cursor
-    cursor = get_cursor()
-    
-    # Get user stats
-    cursor.execute("SELECT points, streak_days FROM users WHERE id = ?", (CURRENT_USER["id"],))
-    user_stats = cursor.fetchone()
-    points = user_stats[0] if user_stats else 0
-    streak = user_stats[1] if user_stats else 0
+    user = get_user_session(page)
     
-    # Count completed items
-    cursor.execute("SELECT COUNT(*) FROM completed_lessons WHERE user_id = ?", (CURRENT_USER["id"],))
-    completed_lessons = cursor.fetchone()[0]
+    # User stats come from the session
+    points = user.points
+    streak = user.current_streak()
     
-    cursor.execute("SELECT COUNT(*) FROM completed_quizzes WHERE user_id = ?", (CURRENT_USER["id"],))
-    completed_quizzes = cursor.fetchone()[0]
+    # Completed items from the materialized stats
+    stats = get_user_stats(user.id)
+    completed_lessons = stats["lesson"]
+    completed_quizzes = stats["quiz"]
+    completed_tasks = stats["task"]
     
     # User profile section
     user_profile = ft.Container(
@@ -380,10 +1036,10 @@ def dashboard_view(page):
             ft.Row([
                 ft.Icon(ft.Icons.random(), size=50, color="#4CAF50"),  # GREEN
                 ft.Column([
-                    ft.Text(CURRENT_USER["username"], size=20, weight=ft.FontWeight.BOLD),
+                    ft.Text(user.username, size=20, weight=ft.FontWeight.BOLD),
                     ft.Text(
-                        f"{'Premium' if CURRENT_USER['subscription_status'] == 'premium' else 'Free'} Plan", 
-                        color="#FFC107" if CURRENT_USER["subscription_status"] == "premium" else "#616161"  # AMBER or GREY_700
+                        f"{'Premium' if user.is_premium else 'Free'} Plan", 
+                        color="#FFC107" if user.is_premium else "#616161"  # AMBER or GREY_700
                     )
                 ]),
             ], alignment=ft.MainAxisAlignment.START),
@@ -416,7 +1072,7 @@ def dashboard_view(page):
                 ft.Container(
                     content=ft.Column([
                         ft.Text("Completed", size=12),
-                        ft.Text(f"{completed_lessons + completed_quizzes}", size=20, weight=ft.FontWeight.BOLD)
+                        ft.Text(f"{completed_lessons + completed_quizzes + completed_tasks}", size=20, weight=ft.FontWeight.BOLD)
                     ], alignment=ft.MainAxisAlignment.CENTER, spacing=4),
                     border_radius=ft.border_radius.all(8),
                     bgcolor="#E3F2FD",  # BLUE_100
@@ -495,7 +1151,7 @@ def dashboard_view(page):
         padding=20,
         border_radius=ft.border_radius.all(12),
         bgcolor="white",
-        visible=CURRENT_USER["subscription_status"] != "premium",
+        visible=not user.is_premium,
     )
     
     # Assemble the view
@@ -522,32 +1178,75 @@ def dashboard_view(page):
         navigation_bar=get_navbar(page, "/"),
     )
 
-# Lessons List View
-def lessons_list_view(page):
+LIST_PAGE_SIZE = 25  # rows built per page in list views
+LIST_PREFETCH_PIXELS = 300  # load the next page this close to the end
+
+# Scrollable list that builds its rows a page at a time as the user scrolls
+def paged_list(items, build_item):
+    list_view = ft.ListView(spacing=8, expand=True)
+    loaded = 0
+    
+    more_button = ft.TextButton("Load more")
+    
+    def load_more():
+        nonlocal loaded
+        if more_button in list_view.controls:
+            list_view.controls.remove(more_button)
+        
+        rows = items[loaded:loaded + LIST_PAGE_SIZE]
+        list_view.controls.extend(build_item(item) for item in rows)
+        loaded += len(rows)
+        
+        # Fallback for when the first page doesn't fill the screen
+        if loaded < len(items):
+            list_view.controls.append(more_button)
+    
+    def on_more(_):
+        load_more()
+        list_view.update()
+    
+    def on_scroll(e):
+        if loaded < len(items) and e.pixels >= e.max_scroll_extent - LIST_PREFETCH_PIXELS:
+            on_more(e)
+    
+    more_button.on_click = on_more
+    list_view.on_scroll = on_scroll
+    load_more()
+    return list_view
+
+# Tabs whose content is only built the first time each tab is opened
+def lazy_tabs(categories, build_content):
     tabs = ft.Tabs(
         selected_index=0,
-        tabs=[
-            ft.Tab(
-                text="Beginner",
-                content=ft.Column([
-                    *[lesson_item(lesson, page) for lesson in LESSONS["beginner"]]
-                ], scroll=ft.ScrollMode.AUTO, spacing=8, expand=True),
-            ),
-            ft.Tab(
-                text="Intermediate",
-                content=ft.Column([
-                    *[lesson_item(lesson, page) for lesson in LESSONS["intermediate"]]
-                ], scroll=ft.ScrollMode.AUTO, spacing=8, expand=True),
-            ),
-            ft.Tab(
-                text="Advanced",
-                content=ft.Column([
-                    *[lesson_item(lesson, page) for lesson in LESSONS["advanced"]]
-                ], scroll=ft.ScrollMode.AUTO, spacing=8, expand=True),
-            ),
-        ],
+        tabs=[ft.Tab(text=category.capitalize(), content=ft.Container()) for category in categories],
         expand=True,
     )
+    built = set()
+    
+    def ensure_built(index):
+        if index not in built and 0 <= index < len(categories):
+            tabs.tabs[index].content = build_content(categories[index])
+            built.add(index)
+    
+    def on_change(_):
+        ensure_built(tabs.selected_index)
+        tabs.update()
+    
+    tabs.on_change = on_change
+    ensure_built(0)
+    return tabs
+
+# Lessons List View
+def lessons_list_view(page):
+    completed = get_completion_set(get_user_session(page).id, "lesson")
+    
+    tabs = lazy_tabs(
+        CATALOG.categories("lesson"),
+        lambda category: paged_list(
+            CATALOG.by_category("lesson", category),
+            lambda lesson: lesson_item(lesson, page, completed),
+        ),
+    )
     
     return ft.View(
         "/lessons",
@@ -564,12 +1263,13 @@ def lessons_list_view(page):
     )
 
 # Single lesson item
-def lesson_item(lesson, page):
+def lesson_item(lesson, page, completed):
+    user = get_user_session(page)
     premium_badge = get_premium_badge(lesson["premium"])
-    progress_badge = get_progress_badge(CURRENT_USER["id"], lesson["id"])
+    progress_badge = get_progress_badge(lesson["id"] in completed)
     
     # Check if premium content and user has free status
-    is_locked = lesson["premium"] and CURRENT_USER["subscription_status"] == "free"
+    is_locked = user.is_locked(lesson)
     
     return ft.Container(
         content=ft.ListTile(
@@ -599,20 +1299,14 @@ def lesson_item(lesson, page):
         border_radius=ft.border_radius.all(8),
     )
 
+LESSON_COMPLETE_DELAY = 1  # seconds a completed lesson stays on screen
+
 # Lesson Detail View
 def lesson_detail_view(page, lesson_id):
-    # Get thread-local cursor
-    cursor = get_cursor()
+    user = get_user_session(page)
     
     # Find the lesson
-    lesson = None
-    for category in LESSONS:
-        for l in LESSONS[category]:
-            if l["id"] == lesson_id:
-                lesson = l
-                break
-        if lesson:
-            break
+    lesson = CATALOG.load("lesson", lesson_id)
     
     if not lesson:
         return ft.View(
@@ -629,40 +1323,46 @@ def lesson_detail_view(page, lesson_id):
             ],
         )
     
-    def mark_complete():
-        # Get thread-local connection and cursor
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Record completion in database
-        cursor.execute(
-            "INSERT OR REPLACE INTO completed_lessons (user_id, lesson_id, completed_date) VALUES (?, ?, ?)",
-            (CURRENT_USER["id"], lesson_id, time.strftime("%Y-%m-%d %H:%M:%S"))
-        )
+    async def mark_complete(_):
+        if complete_button.disabled:
+            return
         
-        # Update user points
-        cursor.execute(
-            "UPDATE users SET points = points + ? WHERE id = ?",
-            (10, CURRENT_USER["id"])
-        )
-        conn.commit()
+        # Record completion and points through the progress writer; the
+        # write happens in the background
+        progress_writer.submit(user.id, "lesson", lesson_id, points=10, day=user.record_activity())
+        user.points += 10
         
-        # Show confirmation
-        page.show_snack_bar(ft.SnackBar(content=ft.Text("Lesson completed! +10 XP"), bgcolor="#4CAF50"))  # GREEN
+        # Show the lesson as completed straight away
+        complete_button.disabled = True
+        complete_button.style.bgcolor = "#9E9E9E"  # GREY_400
+        status_text.value = "Completed"
+        complete_button.update()
+        status_text.update()
+        page.open(ft.SnackBar(content=ft.Text("Lesson completed! +10 XP"), bgcolor="#4CAF50"))  # GREEN
         
-        # Update UI
-        page.update()
-        
-        # Navigate back after delay
-        time.sleep(1)
+        # Navigate back after delay without holding a handler thread
+        await asyncio.sleep(LESSON_COMPLETE_DELAY)
         page.go("/lessons")
     
     # Check if already completed
-    cursor.execute(
-        "SELECT * FROM completed_lessons WHERE user_id = ? AND lesson_id = ?",
-        (CURRENT_USER["id"], lesson_id)
+    already_completed = is_completed(user.id, "lesson", lesson_id)
+    
+    complete_button = ft.ElevatedButton(
+        "Mark as Complete",
+        style=ft.ButtonStyle(
+            bgcolor="#4CAF50" if not already_completed else "#9E9E9E",  # GREEN or GREY_400
+            color="white",
+        ),
+        width=float("inf"),
+        on_click=mark_complete,
+        disabled=already_completed,
+    )
+    
+    status_text = ft.Text(
+        "Already completed" if already_completed else "",
+        color="#616161",  # GREY_600
+        text_align=ft.TextAlign.CENTER,
     )
-    already_completed = cursor.fetchone() is not None
     
     return ft.View(
         f"/lessons/{lesson_id}",
@@ -680,24 +1380,11 @@ def lesson_detail_view(page, lesson_id):
                         lesson["content"],
                         extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
                         code_theme="atom-one-dark",
-                        code_style=ft.TextStyle(font_family="monospace", size=14),
+                        code_style_sheet=ft.MarkdownStyleSheet(code_text_style=ft.TextStyle(font_family="monospace", size=14)),
                     ),
                     ft.Container(height=16),
-                    ft.ElevatedButton(
-                        "Mark as Complete",
-                        style=ft.ButtonStyle(
-                            bgcolor="#4CAF50" if not already_completed else "#9E9E9E",  # GREEN or GREY_400
-                            color="white",
-                        ),
-                        width=float("inf"),
-                        on_click=lambda _: mark_complete() if not already_completed else None,
-                        disabled=already_completed,
-                    ),
-                    ft.Text(
-                        "Already completed" if already_completed else "",
-                        color="#616161",  # GREY_600
-                        text_align=ft.TextAlign.CENTER,
-                    ),
+                    complete_button,
+                    status_text,
                 ], scroll=ft.ScrollMode.AUTO, expand=True),
                 padding=20,
                 expand=True,
@@ -707,19 +1394,15 @@ def lesson_detail_view(page, lesson_id):
 
 # Quizzes List View
 def quizzes_list_view(page):
-    categories = list(QUIZZES.keys())
-    
-    tabs = ft.Tabs(
-        selected_index=0,
-        tabs=[
-            ft.Tab(
-                text=category.capitalize(),
-                content=ft.Column([
-                    *[quiz_item(quiz, page) for quiz in QUIZZES[category]]
-                ], scroll=ft.ScrollMode.AUTO, spacing=8, expand=True),
-            ) for category in categories
-        ],
-        expand=True,
+    categories = CATALOG.categories("quiz")
+    completed = get_completion_set(get_user_session(page).id, "quiz")
+    
+    tabs = lazy_tabs(
+        categories,
+        lambda category: paged_list(
+            CATALOG.by_category("quiz", category),
+            lambda quiz: quiz_item(quiz, page, completed),
+        ),
     )
     
     return ft.View(
@@ -737,12 +1420,13 @@ def quizzes_list_view(page):
     )
 
 # Single quiz item
-def quiz_item(quiz, page):
+def quiz_item(quiz, page, completed):
+    user = get_user_session(page)
     premium_badge = get_premium_badge(quiz["premium"])
-    progress_badge = get_progress_badge(CURRENT_USER["id"], quiz["id"], "quiz")
+    progress_badge = get_progress_badge(quiz["id"] in completed)
     
     # Check if premium content and user has free status
-    is_locked = quiz["premium"] and CURRENT_USER["subscription_status"] == "free"
+    is_locked = user.is_locked(quiz)
     
     return ft.Container(
         content=ft.ListTile(
@@ -755,7 +1439,7 @@ def quiz_item(quiz, page):
                 color="#9E9E9E" if is_locked else "black",  # GREY_400 or BLACK
             ),
             subtitle=ft.Text(
-                "Premium content" if is_locked else f"{len(quiz['questions'])} questions",
+                "Premium content" if is_locked else f"{quiz['question_count']} questions",
                 color="#9E9E9E" if is_locked else "#616161",  # GREY_400 or GREY_700
             ),
             trailing=ft.Row([
@@ -774,18 +1458,10 @@ def quiz_item(quiz, page):
 
 # Quiz Detail View
 def quiz_detail_view(page, quiz_id):
-    # Get thread-local cursor
-    cursor = get_cursor()
+    user = get_user_session(page)
     
     # Find the quiz
-    quiz = None
-    for category in QUIZZES:
-        for q in QUIZZES[category]:
-            if q["id"] == quiz_id:
-                quiz = q
-                break
-        if quiz:
-            break
+    quiz = CATALOG.load("quiz", quiz_id)
     
     if not quiz:
         return ft.View(
@@ -803,17 +1479,23 @@ def quiz_detail_view(page, quiz_id):
         )
     
     current_question = 0
-    questions = quiz["questions"]
-    answers = [-1] * len(questions)
+    attempt = QuizAttempt(quiz, user.id)
+    questions = attempt.questions
     
     # Create the quiz view elements
+    question_number = ft.Text(f"Question 1/{len(questions)}", weight=ft.FontWeight.BOLD)
+    
     question_text = ft.Text(
         questions[current_question]["question"],
         size=18,
         weight=ft.FontWeight.BOLD,
     )
     
-    options_list = ft.Column(spacing=8)
+    options_list = ft.Container()
+    
+    # Option controls per question, built the first time the question is shown
+    option_groups = {}
+    option_rows = {}
     
     next_button = ft.ElevatedButton(
         "Next",
@@ -831,7 +1513,7 @@ def quiz_detail_view(page, quiz_id):
     question_container = ft.Container(
         content=ft.Column([
             ft.Row([
-                ft.Text(f"Question 1/{len(questions)}", weight=ft.FontWeight.BOLD),
+                question_number,
                 progress_bar,
             ]),
             ft.Container(height=16),
@@ -847,29 +1529,37 @@ def quiz_detail_view(page, quiz_id):
         expand=True,
     )
     
-    def update_question():
-        nonlocal current_question
-        
+    def build_options(question_index):
+        rows = [
+            ft.Container(
+                content=ft.ListTile(
+                    leading=ft.Radio(value=str(i)),
+                    title=ft.Text(option),
+                ),
+                on_click=lambda _, i=i: select_answer(i),
+                bgcolor="white",
+                border_radius=ft.border_radius.all(8),
+            )
+            for i, option in enumerate(questions[question_index]["options"])
+        ]
+        option_rows[question_index] = rows
+        option_groups[question_index] = ft.RadioGroup(
+            content=ft.Column(rows, spacing=8),
+            on_change=lambda e: select_answer(int(e.control.value)),
+        )
+    
+    def update_question(send=True):
         # Update progress
         progress_bar.value = (current_question + 1) / len(questions)
         
         # Update question number and text
+        question_number.value = f"Question {current_question + 1}/{len(questions)}"
         question_text.value = questions[current_question]["question"]
         
-        # Update options
-        options_list.controls.clear()
-        for i, option in enumerate(questions[current_question]["options"]):
-            options_list.controls.append(
-                ft.Container(
-                    content=ft.ListTile(
-                        leading=ft.Radio(value=str(i), selected=answers[current_question] == i),
-                        title=ft.Text(option),
-                    ),
-                    on_click=lambda _, i=i: select_answer(i),
-                    bgcolor="white",
-                    border_radius=ft.border_radius.all(8),
-                )
-            )
+        # Swap in this question's options
+        if current_question not in option_groups:
+            build_options(current_question)
+        options_list.content = option_groups[current_question]
         
         # Update button text
         if current_question == len(questions) - 1:
@@ -877,18 +1567,31 @@ def quiz_detail_view(page, quiz_id):
         else:
             next_button.text = "Next"
         
-        page.update()
+        if send:
+            question_container.update()
     
     def select_answer(index):
-        answers[current_question] = index
-        update_question()
+        previous = attempt.answers[current_question]
+        if previous == index:
+            return
+        attempt.answer(current_question, index)
+        
+        # Only the group value and the two affected rows change, so the
+        # group-level update sends just those properties
+        group = option_groups[current_question]
+        rows = option_rows[current_question]
+        group.value = str(index)
+        rows[index].bgcolor = "#E8F5E9"  # LIGHT GREEN
+        if previous != -1:
+            rows[previous].bgcolor = "white"
+        group.update()
     
     def next_question(_):
         nonlocal current_question
         
         # If no answer selected
-        if answers[current_question] == -1:
-            page.show_snack_bar(ft.SnackBar(content=ft.Text("Please select an answer")))
+        if not attempt.is_answered(current_question):
+            page.open(ft.SnackBar(content=ft.Text("Please select an answer")))
             return
         
         if current_question < len(questions) - 1:
@@ -896,13 +1599,10 @@ def quiz_detail_view(page, quiz_id):
             current_question += 1
             update_question()
         else:
-            # Calculate score
-            correct_count = 0
-            for i, question in enumerate(questions):
-                if answers[i] == question["correct"]:
-                    correct_count += 1
-            
-            score = int(100 * correct_count / len(questions))
+            # Grade the whole attempt; it is stored along with the completion below
+            grade = grade_attempt(attempt)
+            correct_count = grade["correct_count"]
+            score = grade["score"]
             
             # Show result
             question_container.content.controls.clear()
@@ -923,29 +1623,19 @@ def quiz_detail_view(page, quiz_id):
                 ),
             ])
             
-            # Save result to database
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT OR REPLACE INTO completed_quizzes (user_id, quiz_id, score, completed_date) VALUES (?, ?, ?, ?)",
-                (CURRENT_USER["id"], quiz_id, score, time.strftime("%Y-%m-%d %H:%M:%S"))
-            )
-            
-            # Award points
+            # Save result and award points
             points = correct_count * 5
-            cursor.execute(
-                "UPDATE users SET points = points + ? WHERE id = ?",
-                (points, CURRENT_USER["id"])
+            progress_writer.submit(
+                user.id, "quiz", quiz_id, points=points, score=score, day=user.record_activity(), attempt=(attempt, grade)
             )
-            conn.commit()
+            user.points += points
             
-            page.update()
+            question_container.update()
     
     next_button.on_click = next_question
     
-    # Initial setup
-    update_question()
+    # Initial setup; the controls are sent with the view itself
+    update_question(send=False)
     
     return ft.View(
         f"/quizzes/{quiz_id}",
@@ -963,19 +1653,15 @@ def quiz_detail_view(page, quiz_id):
 
 # Coding Tasks List View
 def coding_tasks_list_view(page):
-    categories = list(CODING_TASKS.keys())
-    
-    tabs = ft.Tabs(
-        selected_index=0,
-        tabs=[
-            ft.Tab(
-                text=category.capitalize(),
-                content=ft.Column([
-                    *[task_item(task, page, category) for task in CODING_TASKS[category]]
-                ], scroll=ft.ScrollMode.AUTO, spacing=8, expand=True),
-            ) for category in categories
-        ],
-        expand=True,
+    categories = CATALOG.categories("task")
+    completed = get_completion_set(get_user_session(page).id, "task")
+    
+    tabs = lazy_tabs(
+        categories,
+        lambda category: paged_list(
+            CATALOG.by_category("task", category),
+            lambda task: task_item(task, page, completed),
+        ),
     )
     
     return ft.View(
@@ -993,11 +1679,13 @@ def coding_tasks_list_view(page):
     )
 
 # Single task item
-def task_item(task, page, category):
+def task_item(task, page, completed):
+    user = get_user_session(page)
     premium_badge = get_premium_badge(task["premium"])
+    progress_badge = get_progress_badge(task["id"] in completed)
     
     # Check if premium content and user has free status
-    is_locked = task["premium"] and CURRENT_USER["subscription_status"] == "free"
+    is_locked = user.is_locked(task)
     
     return ft.Container(
         content=ft.ListTile(
@@ -1013,28 +1701,89 @@ def task_item(task, page, category):
                 "Premium content" if is_locked else "Coding challenge",
                 color="#9E9E9E" if is_locked else "#616161",  # GREY_400 or GREY_700
             ),
-            trailing=premium_badge,
+            trailing=ft.Row([
+                premium_badge,
+                ft.Container(width=4),
+                progress_badge,
+            ], spacing=0),
         ),
         on_click=lambda _: (
-            page.go(f"/coding/{category}/{task['id']}") if not is_locked else 
+            page.go(f"/coding/{task['id']}") if not is_locked else 
             show_premium_dialog(page)
         ),
         bgcolor="white",
         border_radius=ft.border_radius.all(8),
     )
 
+TEST_STATUS_STYLES = {
+    "passed": (ft.icons.CHECK_CIRCLE, "#4CAF50"),  # GREEN
+    "failed": (ft.icons.CANCEL, "#F44336"),  # RED
+    "error": (ft.icons.ERROR, "#F44336"),  # RED
+    "timeout": (ft.icons.TIMER_OFF, "#F44336"),  # RED
+    "skipped": (ft.icons.REMOVE_CIRCLE_OUTLINE, "#9E9E9E"),  # GREY_400
+}
+
+# One line of a task's test results
+def test_case_row(case):
+    icon, color = TEST_STATUS_STYLES[case["status"]]
+    if case["status"] == "failed":
+        detail = f"expected {case['expected']}, got {case['actual']}"
+    elif case["status"] == "error":
+        detail = case["error"]
+    elif case["status"] == "timeout":
+        detail = "took too long"
+    else:
+        detail = case["status"]
+    
+    return ft.Row([
+        ft.Icon(icon, color=color, size=18),
+        ft.Text(f"{case['name']}: {detail}", expand=True),
+    ])
+
+# Human-readable duration and size for the complexity report
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+# Fitted growth class and per-size timings of a complexity-graded run
+def complexity_report(report):
+    icon, color = TEST_STATUS_STYLES["passed" if report["passed"] else "failed"]
+    summary = f"Complexity: {report['fitted'] or 'unknown'} (target {report['target']})"
+    if "exponent" in report:
+        summary += f", time ~ n^{report['exponent']}"
+    if report.get("reason"):
+        summary += f" - {report['reason']}"
+    
+    rows = [ft.Row([ft.Icon(icon, color=color, size=18), ft.Text(summary, weight=ft.FontWeight.BOLD, expand=True)])]
+    for size in report["sizes"]:
+        if size["status"] == "timeout":
+            detail = "too slow"
+        else:
+            detail = f"{format_seconds(size['seconds'])}, peak memory {format_bytes(size['peak_bytes'])}"
+        rows.append(ft.Text(f"n = {size['n']:,}: {detail}", color="#616161"))  # GREY_700
+    
+    return ft.Column(rows, spacing=4)
+
 # Coding Task Detail View
-def coding_task_view(page, category, task_id):
+def coding_task_view(page, task_id):
+    user = get_user_session(page)
+    
     # Find the task
-    task = None
-    for t in CODING_TASKS.get(category, []):
-        if t["id"] == task_id:
-            task = t
-            break
+    task = CATALOG.load("task", task_id)
     
     if not task:
         return ft.View(
-            f"/coding/{category}/{task_id}",
+            f"/coding/{task_id}",
             [
                 ft.AppBar(
                     title=ft.Text("Task Not Found"),
@@ -1047,6 +1796,9 @@ def coding_task_view(page, category, task_id):
             ],
         )
     
+    # Checked while building the view, so the async run handler never queries the database
+    already_completed = is_completed(user.id, "task", task_id)
+    
     code_editor = ft.TextField(
         value=task["starter_code"],
         multiline=True,
@@ -1075,8 +1827,41 @@ def coding_task_view(page, category, task_id):
     
     result_text = ft.Text("", size=16, weight=ft.FontWeight.BOLD)
     
-    def run_code(_):
-        result = run_python_code(code_editor.value)
+    steps_text = ft.Text("", color="#616161")  # GREY_700
+    
+    test_results = ft.Column(spacing=4)
+    
+    run_button = ft.ElevatedButton(
+        "Run Code",
+        style=ft.ButtonStyle(
+            bgcolor="#2196F3",  # BLUE
+            color="white",
+        ),
+        expand=True,
+    )
+    
+    async def run_code(_):
+        nonlocal already_completed
+        
+        # Show the running state right away
+        run_button.disabled = True
+        output_text.value = ""
+        test_results.controls.clear()
+        steps_text.value = ""
+        result_text.value = "Running…"
+        result_text.color = "#616161"  # GREY_700
+        page.update()
+        
+        # Stream partial output as it arrives
+        def append_output(chunk):
+            output_text.value += chunk
+            output_text.update()
+        
+        result, passed = await run_task_submission(task, code_editor.value, on_output=append_output)
+        run_button.disabled = False
+        
+        if "steps" in result:
+            steps_text.value = f"Steps used: {result['steps']:,} of {task['max_steps']:,}"
         
         if result["error"]:
             output_text.value = f"Error: {result['error']}"
@@ -1088,27 +1873,20 @@ def coding_task_view(page, category, task_id):
             result_text.color = "#F44336"  # RED
         else:
             output_text.value = result["output"].strip()
+            test_results.controls.extend(test_case_row(case) for case in result.get("tests") or [])
+            if result.get("complexity"):
+                test_results.controls.append(complexity_report(result["complexity"]))
             
             # Check if output matches expected result
-            if output_text.value.strip() == task["validation"].strip():
+            if passed:
                 result_text.value = "Correct! Your solution works"
                 result_text.color = "#4CAF50"  # GREEN
                 
-                # Award points (only for first completion)
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute(
-                    "UPDATE users SET points = points + ? WHERE id = ? AND NOT EXISTS (SELECT 1 FROM completed_lessons WHERE user_id = ? AND lesson_id = ?)",
-                    (20, CURRENT_USER["id"], CURRENT_USER["id"], f"task_{category}_{task_id}")
-                )
-                
-                # Record completion
-                cursor.execute(
-                    "INSERT OR IGNORE INTO completed_lessons (user_id, lesson_id, completed_date) VALUES (?, ?, ?)",
-                    (CURRENT_USER["id"], f"task_{category}_{task_id}", time.strftime("%Y-%m-%d %H:%M:%S"))
-                )
-                conn.commit()
+                # Record completion; points are only awarded for the first one
+                if not already_completed:
+                    user.points += 20
+                    already_completed = True
+                progress_writer.submit(user.id, "task", task_id, points=20, day=user.record_activity())
             else:
                 result_text.value = "Not quite right. Try again!"
                 result_text.color = "#F44336"  # RED
@@ -1119,8 +1897,10 @@ def coding_task_view(page, category, task_id):
         code_editor.value = task["test_code"]
         page.update()
     
+    run_button.on_click = run_code
+    
     return ft.View(
-        f"/coding/{category}/{task_id}",
+        f"/coding/{task_id}",
         [
             ft.AppBar(
                 title=ft.Text(task["title"]),
@@ -1137,15 +1917,7 @@ def coding_task_view(page, category, task_id):
                     code_editor,
                     ft.Container(height=8),
                     ft.Row([
-                        ft.ElevatedButton(
-                            "Run Code",
-                            style=ft.ButtonStyle(
-                                bgcolor="#2196F3",  # BLUE
-                                color="white",
-                            ),
-                            on_click=run_code,
-                            expand=True,
-                        ),
+                        run_button,
                         ft.Container(width=8),
                         ft.OutlinedButton(
                             "Show Solution",
@@ -1158,6 +1930,8 @@ def coding_task_view(page, category, task_id):
                     output_text,
                     ft.Container(height=8),
                     result_text,
+                    steps_text,
+                    test_results,
                 ], scroll=ft.ScrollMode.AUTO, expand=True),
                 padding=20,
                 expand=True,
@@ -1167,20 +1941,33 @@ def coding_task_view(page, category, task_id):
 
 # Settings View
 def settings_view(page):
+    user = get_user_session(page)
+    
     # Toggle subscription for demo purposes
     def toggle_subscription(_):
-        CURRENT_USER["subscription_status"] = "premium" if CURRENT_USER["subscription_status"] == "free" else "free"
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE users SET subscription_status = ? WHERE id = ?",
-            (CURRENT_USER["subscription_status"], CURRENT_USER["id"])
-        )
-        conn.commit()
+        user.set_subscription("free" if user.is_premium else "premium")
+        page.go("/settings")  # Refresh page
+    
+    def save_timezone(e):
+        try:
+            user.set_timezone(e.control.value.strip())
+        except (ZoneInfoNotFoundError, ValueError):
+            e.control.error_text = "Unknown time zone, e.g. Europe/Warsaw"
+            e.control.update()
+            return
+        e.control.error_text = None
+        e.control.update()
+        page.open(ft.SnackBar(content=ft.Text("Time zone saved")))
         page.go("/settings")  # Refresh page
     
+    timezone_field = ft.TextField(
+        value=user.timezone or "",
+        hint_text="Server time",
+        dense=True,
+        expand=True,
+        on_submit=save_timezone,
+    )
+    
     return ft.View(
         "/settings",
         [
@@ -1202,6 +1989,17 @@ def settings_view(page):
                         border_radius=ft.border_radius.all(8),
                     ),
                     ft.Container(height=8),
+                    ft.Container(
+                        content=ft.Row([
+                            ft.Icon(ft.icons.SCHEDULE, color="#4CAF50"),  # GREEN
+                            ft.Text("Time Zone", size=16),
+                            timezone_field,
+                        ]),
+                        bgcolor="white",
+                        padding=15,
+                        border_radius=ft.border_radius.all(8),
+                    ),
+                    ft.Container(height=8),
                     ft.Container(
                         content=ft.Row([
                             ft.Icon(ft.icons.STAR_OUTLINE, color="#4CAF50"),  # GREEN
@@ -1246,10 +2044,10 @@ def settings_view(page):
                         content=ft.Row([
                             ft.Icon(
                                 ft.icons.WORKSPACE_PREMIUM, 
-                                color="#FFC107" if CURRENT_USER["subscription_status"] == "premium" else "#9E9E9E"  # AMBER or GREY_400
+                                color="#FFC107" if user.is_premium else "#9E9E9E"  # AMBER or GREY_400
                             ),
                             ft.Text(
-                                f"Subscription Status: {CURRENT_USER['subscription_status'].capitalize()}",
+                                f"Subscription Status: {user.subscription_status.capitalize()}",
                                 size=16,
                             ),
                         ]),
@@ -1348,6 +2146,112 @@ def show_premium_dialog(page):
     dialog.open = True
     page.update()
 
+# Build the view for a route, or None if the route is unknown
+def build_view(page, route):
+    if route == "/":
+        return dashboard_view(page)
+    elif route == "/lessons":
+        return lessons_list_view(page)
+    elif route.startswith("/lessons/"):
+        lesson_id = route.split("/")[-1]
+        return lesson_detail_view(page, lesson_id)
+    elif route == "/quizzes":
+        return quizzes_list_view(page)
+    elif route.startswith("/quizzes/"):
+        quiz_id = route.split("/")[-1]
+        return quiz_detail_view(page, quiz_id)
+    elif route == "/coding":
+        return coding_tasks_list_view(page)
+    elif route.startswith("/coding/"):
+        # Also accepts the older /coding/{category}/{task_id} form
+        task_id = route.split("/")[-1]
+        return coding_task_view(page, task_id)
+    elif route == "/settings":
+        return settings_view(page)
+    return None
+
+# Quiz and coding task views hold in-progress answers and code, so they are
+# always built fresh
+def is_cacheable_route(route):
+    return not route.startswith(("/quizzes/", "/coding/"))
+
+# Route with item ids replaced, e.g. /lessons/{id}; used to group timings
+def route_pattern(route):
+    parts = route.split("/")
+    if len(parts) > 2:
+        return "/".join(parts[:2]) + "/{id}"
+    return route
+
+def timed_build_view(page, route):
+    with metrics.timer("view_build", route_pattern(route)):
+        return build_view(page, route)
+
+# View for a route from the session's cache, rebuilt only when the user's data changed
+def get_view(page, route):
+    user = get_user_session(page)
+    if not is_cacheable_route(route):
+        return timed_build_view(page, route)
+    
+    cached = user.cached_view(route)
+    if cached is not None:
+        metrics.increment("view_cache", "hit")
+        return cached
+    
+    metrics.increment("view_cache", "miss")
+    view = timed_build_view(page, route)
+    if view is not None:
+        user.cache_view(route, view)
+    return view
+
+# The single View mounted on a page. Every cached view keeps its body mounted
+# under it as a pane that is only hidden while another route is shown, so
+# going back to a route sends a visibility change. Flet re-sends the whole
+# tree of any control that is removed from the page and added again.
+class ViewHost:
+    def __init__(self, user):
+        self.user = user
+        self.view = ft.View("/")
+        self._panes = {}  # route -> (built view, pane)
+        self._navbar = None  # first navigation bar shown, kept mounted
+    
+    def show(self, route, built):
+        entry = self._panes.get(route)
+        if entry is None or entry[0] is not built:
+            if entry is not None:
+                self.view.controls.remove(entry[1])
+            pane = ft.Column(
+                [control for control in built.controls if not isinstance(control, ft.AppBar)],
+                expand=True,
+                spacing=built.spacing,
+                scroll=built.scroll,
+                horizontal_alignment=built.horizontal_alignment,
+                alignment=built.vertical_alignment,
+            )
+            self._panes[route] = (built, pane)
+            self.view.controls.append(pane)
+        
+        # Unmount panes whose views have left the cache or gone stale
+        for other, (view, pane) in list(self._panes.items()):
+            if other != route and not self.user.holds_view(other, view):
+                self.view.controls.remove(pane)
+                del self._panes[other]
+            else:
+                pane.visible = other == route
+        
+        # The app bar is small and simply swapped; the navigation bar is
+        # kept and only has its selection changed
+        self.view.route = route
+        self.view.appbar = next((control for control in built.controls if isinstance(control, ft.AppBar)), built.appbar)
+        self.view.floating_action_button = built.floating_action_button
+        if built.navigation_bar is not None:
+            if self._navbar is None:
+                self._navbar = built.navigation_bar
+            else:
+                select_nav_destination(self._navbar, built.navigation_bar.data)
+        if self._navbar is not None:
+            self._navbar.visible = built.navigation_bar is not None
+            self.view.navigation_bar = self._navbar
+
 # Main app function
 def main(page: ft.Page):
     # Configure page
@@ -1355,47 +2259,21 @@ def main(page: ft.Page):
     page.theme = get_theme()
     page.bgcolor = "#ECEFF1"  # BLUE_GREY_50
     
-    # Ensure the user exists
-    ensure_user_exists()
+    # Load this session's user once
+    host = ViewHost(get_user_session(page))
     
     # Set up routes
     def route_change(e):
-        route = page.route
-        
-        # Make sure the user exists in this thread too
-        ensure_user_exists()
-        
-        if route == "/":
-            page.views.clear()
-            page.views.append(dashboard_view(page))
-        elif route == "/lessons":
-            page.views.clear()
-            page.views.append(lessons_list_view(page))
-        elif route.startswith("/lessons/"):
-            lesson_id = route.split("/")[-1]
-            page.views.clear()
-            page.views.append(lesson_detail_view(page, lesson_id))
-        elif route == "/quizzes":
-            page.views.clear()
-            page.views.append(quizzes_list_view(page))
-        elif route.startswith("/quizzes/"):
-            quiz_id = route.split("/")[-1]
-            page.views.clear()
-            page.views.append(quiz_detail_view(page, quiz_id))
-        elif route == "/coding":
-            page.views.clear()
-            page.views.append(coding_tasks_list_view(page))
-        elif route.startswith("/coding/"):
-            parts = route.split("/")
-            if len(parts) >= 4:
-                category, task_id = parts[2], parts[3]
-                page.views.clear()
-                page.views.append(coding_task_view(page, category, task_id))
-        elif route == "/settings":
-            page.views.clear()
-            page.views.append(settings_view(page))
-        
-        page.update()
+        with metrics.timer("route", route_pattern(page.route)):
+            view = get_view(page, page.route)
+            
+            if view is not None:
+                host.show(page.route, view)
+                if not page.views or page.views[-1] is not host.view:
+                    page.views.clear()
+                    page.views.append(host.view)
+            
+            page.update()
     
     def view_pop(e):
         if len(page.views) > 1:
@@ -1408,4 +2286,14 @@ def main(page: ft.Page):
     # Initial route
     page.go("/")
 
-ft.app(main, view=ft.WEB_BROWSER)
\ No newline at end of file
+if __name__ == "__main__":
+    # Maintenance job: rebuild all streaks from the activity log and exit
+    if "--recompute-streaks" in sys.argv:
+        print(f"Recomputed streaks for {recompute_streaks(db_pool)} users")
+        sys.exit(0)
+    
+    # Start the code runner (fork server or worker pool) before the UI starts its threads
+    get_runner()
+    atexit.register(shutdown_runners)
+    metrics.start_exporter()
+    ft.app(main, view=ft.WEB_BROWSER)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import operator
+import random
+from datetime import datetime
+
+# Quiz attempts independent of the UI. A quiz body holds a pool of questions
+# and may set "draw": N to ask N of them per attempt; without it every
+# question is asked. The draw is reproducible from the attempt's seed.
+
+SEED_BITS = 32
+NO_ANSWER = -1
+
+# Indices of the questions asked for a seed, in the order they are asked
+def draw_questions(pool_size, count=None, seed=0):
+    if count is None or count >= pool_size:
+        count = pool_size
+    return random.Random(seed).sample(range(pool_size), count)
+
+def new_seed():
+    return random.SystemRandom().getrandbits(SEED_BITS)
+
+class QuizAttempt:
+    def __init__(self, quiz, user_id, seed=None):
+        self.quiz_id = quiz["id"]
+        self.user_id = user_id
+        self.seed = new_seed() if seed is None else seed
+        self.question_indices = draw_questions(len(quiz["questions"]), quiz.get("draw"), self.seed)
+        self.questions = [quiz["questions"][i] for i in self.question_indices]
+        self.key = [question["correct"] for question in self.questions]
+        self.answers = [NO_ANSWER] * len(self.questions)
+        self.id = None
+
+    def answer(self, position, option):
+        self.answers[position] = option
+
+    def is_answered(self, position):
+        return self.answers[position] != NO_ANSWER
+
+# Grade every answer in one pass; returns per-question results and totals
+def grade_answers(answers, key):
+    results = list(map(operator.eq, answers, key))
+    correct_count = sum(results)
+    score = int(100 * correct_count / len(key)) if key else 0
+    return {"results": results, "correct_count": correct_count, "score": score}
+
+def grade_attempt(attempt):
+    return grade_answers(attempt.answers, attempt.key)
+
+# Insert the attempt and all of its responses on an open write connection,
+# e.g. inside the progress writer's batch
+def write_attempt(conn, attempt, grade, completed_date):
+    cursor = conn.execute(
+        "INSERT INTO quiz_attempts (user_id, quiz_id, seed, score, correct_count, question_count, completed_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (attempt.user_id, attempt.quiz_id, attempt.seed, grade["score"],
+         grade["correct_count"], len(attempt.questions), completed_date)
+    )
+    attempt.id = cursor.lastrowid
+    conn.executemany(
+        "INSERT INTO quiz_responses (attempt_id, position, question_index, answer, correct) VALUES (?, ?, ?, ?, ?)",
+        [
+            (attempt.id, position, question_index, answer, int(correct))
+            for position, (question_index, answer, correct) in enumerate(
+                zip(attempt.question_indices, attempt.answers, grade["results"])
+            )
+        ]
+    )
+    return attempt.id
+
+# Store the attempt and all of its responses in a single write transaction
+def save_attempt(pool, attempt, grade=None):
+    grade = grade or grade_attempt(attempt)
+    with pool.connection(write=True) as conn:
+        return write_attempt(conn, attempt, grade, datetime.now().isoformat())
+
+# Responses of a stored attempt, in the order the questions were asked
+def load_responses(pool, attempt_id):
+    with pool.connection() as conn:
+        return conn.execute(
+            "SELECT position, question_index, answer, correct FROM quiz_responses WHERE attempt_id = ? ORDER BY position",
+            (attempt_id,)
+        ).fetchall()
@@ -0,0 +1,1107 @@
+import asyncio
+import builtins
+import dis
+import functools
+import hashlib
+import importlib
+import itertools
+import marshal
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import complexity
+import metrics
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Default limits for a single submission. Output caps count characters
+# (str length), so non-ASCII output can take up to 4 bytes per character.
+POOL_SIZE = 2
+MAX_RUNS_PER_WORKER = 50
+CPU_SECONDS = 5
+MEMORY_LIMIT = 256 * 1024 * 1024  # bytes on top of the worker's own footprint
+MAX_OUTPUT_CHARS = 1024 * 1024  # a run printing more than this is stopped
+MAX_OUTPUT_LINES = 10000
+OUTPUT_HEAD_CHARS = 32 * 1024  # kept from the start of the output
+OUTPUT_TAIL_CHARS = 16 * 1024  # kept from the end of the output
+STREAM_CHUNK_CHARS = 1024
+STREAM_INTERVAL = 0.05  # seconds between partial output chunks
+TEST_CASE_TIMEOUT = 1  # seconds per test case, where the platform allows it
+MAX_VALUE_REPR = 200  # characters of a returned value shown in test results
+RUN_CACHE_ENTRIES = 1024
+RUN_CACHE_BYTES = 16 * 1024 * 1024
+WAIT_SAMPLES = 10000  # recent queue waits kept for reporting
+FORK_MAX_CHILDREN = 8  # submissions running at once under the fork server
+PRELOAD_MODULES = ("math", "collections", "itertools", "functools", "re", "json")
+
+TERMINATED_ERROR = "Execution was terminated (resource limit exceeded)"
+STEP_LIMIT_ERROR = "Step limit exceeded"
+SUBMISSION_FILENAME = "<submission>"
+
+# "fork" forks a child per run from a warm server, "process" runs in the
+# worker pool, "thread" runs in this process
+EXECUTION_MODE = "fork" if hasattr(os, "fork") else "process"
+
+# Raised inside a run whose output buffer has been abandoned
+class _RunCancelled(BaseException):
+    pass
+
+# Raised by SIGALRM when a single test case runs out of time
+class _CaseTimeout(BaseException):
+    pass
+
+# Raised by the step counter once a submission has used up its budget
+class _StepLimitExceeded(BaseException):
+    pass
+
+# Counts executed lines of the submission. Unlike a wall-clock timeout the
+# count doesn't depend on machine load, so a budget gives the same verdict
+# everywhere. Only frames compiled from the submission are traced; time
+# spent inside builtins and the standard library is not counted, which is
+# what the wall-clock timeout is still there for.
+#
+# CPython turns tracing off once a trace function raises, so a submission
+# that catches _StepLimitExceeded would run on uncounted. on_exceeded is
+# called first and is expected to end the run for good. In workers and fork
+# children the submission can't replace the trace function either (see
+# _guard_step_counter).
+#
+# A loop that jumps straight back to itself, like "while True: pass", never
+# starts a new line. Frames containing one also get opcode events, and each
+# such jump counts as a step.
+class _StepCounter:
+    def __init__(self, max_steps, on_exceeded=None):
+        self.max_steps = max_steps
+        self.on_exceeded = on_exceeded
+        self.steps = 0
+        self._self_jumps = {}  # code object -> offsets of jumps to themselves
+
+    def call(self, frame, event, arg):
+        code = frame.f_code
+        if code.co_filename != SUBMISSION_FILENAME:
+            return None
+        if code not in self._self_jumps:
+            self._self_jumps[code] = {
+                instruction.offset for instruction in dis.get_instructions(code)
+                if instruction.opname.startswith("JUMP") and instruction.argval == instruction.offset
+            }
+        if self._self_jumps[code]:
+            frame.f_trace_opcodes = True
+        return self.line
+
+    def line(self, frame, event, arg):
+        if event == "line" or (event == "opcode" and frame.f_lasti in self._self_jumps[frame.f_code]):
+            self.steps += 1
+            if self.steps > self.max_steps:
+                if self.on_exceeded:
+                    self.on_exceeded()
+                raise _StepLimitExceeded()
+        return self.line
+
+# True while a step budget is being counted in this process
+_counting_steps = False
+
+# Audit hook for workers and fork children. While a budget is counted, only
+# this module may change the trace or profile function, so a submission
+# can't switch the counter off with sys.settrace(None). Audit hooks can't be
+# removed, so it is only installed in processes that exist to run
+# submissions; thread mode has no such protection.
+def _guard_step_counter(event, args):
+    if _counting_steps and event in ("sys.settrace", "sys.setprofile"):
+        if sys._getframe(1).f_code.co_filename != __file__:
+            raise RuntimeError(f"{event}() is not allowed while steps are counted")
+
+# Per-run output buffer. Memory stays bounded by a head and a tail window;
+# output in between is only counted. Once the character or line cap is reached
+# the run is stopped. Only the head is streamed through on_chunk.
+class OutputBuffer:
+    def __init__(self, max_chars=MAX_OUTPUT_CHARS, on_chunk=None, max_lines=MAX_OUTPUT_LINES,
+                 head_chars=OUTPUT_HEAD_CHARS, tail_chars=OUTPUT_TAIL_CHARS):
+        self.max_chars = max_chars
+        self.max_lines = max_lines
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.on_chunk = on_chunk
+        self.size = 0
+        self.lines = 0
+        self.truncated = False  # the cap was hit and the run stopped
+        self.cancelled = False
+        self._head = []
+        self._head_size = 0
+        self._tail = deque()
+        self._tail_size = 0
+        self._pending = []
+        self._pending_size = 0
+        self._last_chunk = 0.0  # the first write is streamed immediately
+        self._lock = threading.Lock()
+
+    # Longest prefix of text that stays within both caps
+    def _allowed(self, text):
+        text = text[:max(self.max_chars - self.size, 0)]
+        room = self.max_lines - self.lines
+        if text.count("\n") > room:
+            end = -1
+            for _ in range(max(room, 0)):
+                end = text.index("\n", end + 1)
+            text = text[:end + 1]
+        return text
+
+    def _keep(self, text):
+        head_room = self.head_chars - self._head_size
+        if head_room > 0:
+            head = text[:head_room]
+            self._head.append(head)
+            self._head_size += len(head)
+            if self.on_chunk:
+                self._pending.append(head)
+                self._pending_size += len(head)
+            text = text[head_room:]
+
+        if text and self.tail_chars:
+            self._tail.append(text)
+            self._tail_size += len(text)
+            while self._tail_size > self.tail_chars:
+                excess = self._tail_size - self.tail_chars
+                if len(self._tail[0]) <= excess:
+                    self._tail_size -= len(self._tail.popleft())
+                else:
+                    self._tail[0] = self._tail[0][excess:]
+                    self._tail_size -= excess
+
+    def write(self, text):
+        if self.cancelled or self.truncated:
+            raise _RunCancelled()
+        text = str(text)
+        with self._lock:
+            allowed = self._allowed(text)
+            if allowed:
+                self._keep(allowed)
+                self.size += len(allowed)
+                self.lines += allowed.count("\n")
+            if len(allowed) < len(text):
+                self.truncated = True
+
+        if self._pending and (
+            self.truncated
+            or self._pending_size >= STREAM_CHUNK_CHARS
+            or time.monotonic() - self._last_chunk >= STREAM_INTERVAL
+        ):
+            self.emit_chunk()
+        if self.truncated:
+            # Stop the run; nothing more would be kept anyway
+            raise _RunCancelled()
+        return len(text)
+
+    def flush(self):
+        pass
+
+    # Hand everything written since the last chunk to on_chunk
+    def emit_chunk(self):
+        with self._lock:
+            chunk = "".join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+            self._last_chunk = time.monotonic()
+        if chunk and self.on_chunk:
+            self.on_chunk(chunk)
+
+    def writable(self):
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def getvalue(self):
+        with self._lock:
+            output = "".join(self._head)
+            omitted = self.size - self._head_size - self._tail_size
+            if omitted:
+                output += f"\n... {omitted} characters omitted ...\n"
+            output += "".join(self._tail)
+        if self.truncated:
+            output += "\n... output limit reached, execution stopped"
+        return output
+
+# sys.stdout replacement that sends each thread's writes to its own buffer
+class _StdoutRouter:
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, "buffer", None) or self.default
+
+    def bind(self, buffer):
+        self._local.buffer = buffer
+
+    def unbind(self):
+        self._local.buffer = None
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+_router = None
+_router_lock = threading.Lock()
+
+# Installed once; runs never swap sys.stdout themselves
+def _install_stdout_router():
+    global _router
+    with _router_lock:
+        if _router is None or sys.stdout is not _router:
+            _router = _StdoutRouter(sys.stdout)
+            sys.stdout = _router
+        return _router
+
+# Start sandbox.<entry>(argv) in a fresh interpreter, connected over a socket.
+# The process is not forked from the app, so it inherits none of the app's
+# memory, threads, locks or open files and can be started at any time. POSIX only.
+LAUNCH_BOOTSTRAP = (
+    "import sys; sys.path.insert(0, sys.argv[1]); "
+    "import sandbox; getattr(sandbox, sys.argv[2])(sys.argv[3:])"
+)
+
+def _launch(entry, *args):
+    parent_socket, child_socket = socket.socketpair()
+    process = subprocess.Popen(
+        [sys.executable, "-I", "-c", LAUNCH_BOOTSTRAP, os.path.dirname(os.path.abspath(__file__)),
+         entry, str(child_socket.fileno()), *map(str, args)],
+        pass_fds=(child_socket.fileno(),),
+    )
+    child_socket.close()
+    return process, multiprocessing.connection.Connection(parent_socket.detach())
+
+# Current virtual memory size of this process (0 if unknown)
+def _address_space_in_use():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return 0
+
+# Cap how much more memory the worker may allocate
+def _limit_memory(memory_limit):
+    if resource is None or not memory_limit:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = _address_space_in_use() + memory_limit
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+# CPU time is cumulative per process, so the soft limit moves with every run
+def _limit_cpu(cpu_seconds):
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+# Compile learner code to marshaled bytecode that can be shipped to a worker
+def compile_code(code):
+    return marshal.dumps(compile(code, SUBMISSION_FILENAME, "exec"))
+
+# Accept source, a code object or marshaled bytecode
+def _as_code_object(code):
+    if isinstance(code, bytes):
+        return marshal.loads(code)
+    if isinstance(code, str):
+        return compile(code, SUBMISSION_FILENAME, "exec")
+    return code
+
+# JSON has no tuples, so compare returned sequences as lists
+def _normalize(value):
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    return value
+
+def _short_repr(value):
+    text = repr(value)
+    return text if len(text) <= MAX_VALUE_REPR else text[:MAX_VALUE_REPR] + "..."
+
+def _raise_case_timeout(signum, frame):
+    raise _CaseTimeout()
+
+# SIGALRM only reaches the main thread; thread mode relies on the overall timeout
+def _can_alarm():
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+# Raise complexity.SizeTimeout if the body runs longer than seconds
+@contextmanager
+def _size_alarm(seconds):
+    if not _can_alarm():
+        yield
+        return
+
+    previous_handler = signal.signal(signal.SIGALRM, _raise_case_timeout)
+    try:
+        try:
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+            yield
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except _CaseTimeout:
+        raise complexity.SizeTimeout()
+    finally:
+        signal.signal(signal.SIGALRM, previous_handler)
+
+# Call the submission's function once per case. tests is
+# {"function": name, "cases": [{"name", "args", "kwargs", "expected", "timeout"}],
+#  "fail_fast": bool, "complexity": spec (optional, see complexity.py)}.
+# Results are appended to results as they finish, so a stopped run keeps them.
+def _run_cases(namespace, tests, results):
+    function = namespace.get(tests["function"])
+    if not callable(function):
+        raise NameError(f"Function {tests['function']} is not defined")
+
+    timed = _can_alarm()
+    if timed:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_case_timeout)
+
+    stop = False
+    try:
+        for index, case in enumerate(tests["cases"]):
+            case_result = {"name": case.get("name") or f"Case {index + 1}", "status": "running"}
+            results.append(case_result)
+            if stop:
+                case_result["status"] = "skipped"
+                continue
+
+            try:
+                try:
+                    if timed:
+                        signal.setitimer(signal.ITIMER_REAL, case.get("timeout", TEST_CASE_TIMEOUT))
+                    actual = function(*case.get("args", ()), **case.get("kwargs", {}))
+                finally:
+                    if timed:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+            except _CaseTimeout:
+                case_result["status"] = "timeout"
+            except (Exception, SystemExit) as e:
+                case_result["status"] = "error"
+                case_result["error"] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            except BaseException as e:
+                # The whole run is being stopped (step budget, output cap)
+                case_result["status"] = "error"
+                case_result["error"] = STEP_LIMIT_ERROR if isinstance(e, _StepLimitExceeded) else "Execution stopped"
+                raise
+            else:
+                case_result["actual"] = _short_repr(actual)
+                if _normalize(actual) == _normalize(case["expected"]):
+                    case_result["status"] = "passed"
+                else:
+                    case_result["status"] = "failed"
+                    case_result["expected"] = _short_repr(case["expected"])
+
+            if case_result["status"] != "passed" and tests.get("fail_fast", True):
+                stop = True
+    finally:
+        if timed:
+            signal.signal(signal.SIGALRM, previous_handler)
+
+# Execute one submission, printing into its own buffer; with tests, also
+# run its test cases in the same namespace. With max_steps, the run stops
+# after that many executed lines and reports the steps it used.
+# on_step_limit(result) gets the final result as soon as the budget runs out,
+# before the submission has a chance to catch the stop; worker processes
+# send it and exit there.
+def _execute(code, buffer=None, tests=None, max_steps=None, on_step_limit=None):
+    global _counting_steps
+    result = {"output": "", "error": None, "timeout": False}
+    if tests:
+        result["tests"] = []
+    buffer = buffer or OutputBuffer()
+
+    def step_limit_reached():
+        stopped = {
+            "output": buffer.getvalue(),
+            "error": f"{STEP_LIMIT_ERROR} ({max_steps} steps)",
+            "timeout": False,
+            "steps": max_steps,
+        }
+        if tests:
+            stopped["tests"] = [
+                dict(case, status="error", error=STEP_LIMIT_ERROR) if case["status"] == "running" else case
+                for case in result["tests"]
+            ]
+        buffer.emit_chunk()
+        on_step_limit(stopped)
+
+    counter = None
+    if max_steps:
+        counter = _StepCounter(max_steps, step_limit_reached if on_step_limit else None)
+    router = _install_stdout_router()
+    router.bind(buffer)
+
+    def injected_print(*args, **kwargs):
+        if kwargs.get("file") is None:
+            kwargs["file"] = buffer
+        builtins.print(*args, **kwargs)
+
+    namespace = {"__name__": "__main__", "print": injected_print}
+
+    try:
+        code = _as_code_object(code)
+        if counter:
+            sys.settrace(counter.call)
+            _counting_steps = True
+        try:
+            exec(code, namespace)
+        except SystemExit:
+            pass
+        if tests:
+            _run_cases(namespace, tests, result["tests"])
+            # Performance only counts for a correct function; timings must not include tracing
+            if tests.get("complexity") and all(case["status"] == "passed" for case in result["tests"]):
+                if counter:
+                    sys.settrace(None)
+                result["complexity"] = complexity.grade_complexity(
+                    namespace[tests["function"]], tests["complexity"], _size_alarm
+                )
+        result["output"] = buffer.getvalue()
+    except (SystemExit, _RunCancelled):
+        result["output"] = buffer.getvalue()
+    except _StepLimitExceeded:
+        result["output"] = buffer.getvalue()
+        result["error"] = f"{STEP_LIMIT_ERROR} ({max_steps} steps)"
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    finally:
+        if counter:
+            _counting_steps = False
+            sys.settrace(None)
+            result["steps"] = min(counter.steps, max_steps)
+            # A budget overrun that the submission caught still counts
+            if counter.steps > max_steps and not result["error"]:
+                result["error"] = f"{STEP_LIMIT_ERROR} ({max_steps} steps)"
+        router.unbind()
+        if not buffer.cancelled:
+            buffer.emit_chunk()
+
+    return result
+
+# Run code on a thread of this process; cheap, but a timed-out run cannot be killed.
+# A run that used up its step budget is abandoned the same way, since the
+# submission may catch the stop and keep going.
+def run_in_thread(code, timeout=5, on_output=None, tests=None, max_steps=None):
+    outcome = {}
+    finished = threading.Event()
+    buffer = OutputBuffer(on_chunk=on_output)
+
+    def finish(result):
+        outcome.setdefault("result", result)
+        finished.set()
+
+    def execute():
+        finish(_execute(code, buffer, tests, max_steps, finish))
+
+    thread = threading.Thread(target=execute, daemon=True)
+    thread.start()
+
+    if not finished.wait(timeout):
+        # The next print from the abandoned run ends it
+        buffer.cancel()
+        return {"output": buffer.getvalue(), "error": None, "timeout": True}
+
+    if thread.is_alive():
+        buffer.cancel()
+    return outcome["result"]
+
+# End a run whose step budget is used up; the submission can't catch an exit.
+# The pool replaces a worker that stopped this way.
+def _send_and_exit(conn, result):
+    conn.send(("stopped", result))
+    conn.close()
+    os._exit(0)
+
+# Worker loop: receive code, run it, stream output and send the result back
+def _worker_main(conn, cpu_seconds, memory_limit, max_output_chars=MAX_OUTPUT_CHARS,
+                 max_output_lines=MAX_OUTPUT_LINES):
+    _limit_memory(memory_limit)
+    sys.addaudithook(_guard_step_counter)
+
+    def send_chunk(chunk):
+        conn.send(("output", chunk))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        code, tests, max_steps = job
+        _limit_cpu(cpu_seconds)
+        buffer = OutputBuffer(max_output_chars, send_chunk, max_output_lines)
+        result = _execute(code, buffer, tests, max_steps, functools.partial(_send_and_exit, conn))
+        conn.send(("result", result))
+
+def _worker_entry(argv):
+    fd, cpu_seconds, memory_limit, max_output_chars, max_output_lines = map(int, argv)
+    _worker_main(multiprocessing.connection.Connection(fd), cpu_seconds, memory_limit,
+                 max_output_chars, max_output_lines)
+
+# A worker is a subprocess.Popen started by _launch, or a spawned
+# multiprocessing.Process where _launch is unavailable
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.runs = 0
+
+    def _alive(self):
+        if isinstance(self.process, subprocess.Popen):
+            return self.process.poll() is None
+        return self.process.is_alive()
+
+    def _join(self, timeout=None):
+        if isinstance(self.process, subprocess.Popen):
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                pass
+        else:
+            self.process.join(timeout)
+
+    def kill(self):
+        if self._alive():
+            self.process.kill()
+        self._join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._join(1)
+        self.kill()
+
+# Pool of worker processes that run learner code in isolation. Workers are
+# fresh interpreters, so replacing one after a timeout or recycle never forks
+# the threaded app.
+class SandboxPool:
+    def __init__(self, size=POOL_SIZE, max_runs=MAX_RUNS_PER_WORKER,
+                 cpu_seconds=CPU_SECONDS, memory_limit=MEMORY_LIMIT,
+                 max_output_chars=MAX_OUTPUT_CHARS, max_output_lines=MAX_OUTPUT_LINES):
+        self.size = size
+        self.max_runs = max_runs
+        self.cpu_seconds = cpu_seconds
+        self.memory_limit = memory_limit
+        self.max_output_chars = max_output_chars
+        self.max_output_lines = max_output_lines
+        self._idle = queue.Queue()
+        self._closed = False
+        self.wait_times = deque(maxlen=WAIT_SAMPLES)  # seconds spent waiting for a free worker
+        self.queued = 0  # runs waiting for a free worker
+
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        if hasattr(os, "fork"):
+            return _Worker(*_launch("_worker_entry", self.cpu_seconds, self.memory_limit or 0,
+                                    self.max_output_chars, self.max_output_lines))
+
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.cpu_seconds, self.memory_limit,
+                  self.max_output_chars, self.max_output_lines),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    # submitted is when the run was handed in, if it already waited before
+    # getting here (see run_code_async); it was counted as queued then
+    def run(self, code, timeout=5, on_output=None, tests=None, max_steps=None, submitted=None):
+        result = {"output": "", "error": None, "timeout": False}
+        queued = submitted or time.monotonic()
+        if submitted is None:
+            self.queued += 1
+        try:
+            worker = self._idle.get()
+        finally:
+            self.queued -= 1
+        wait = time.monotonic() - queued
+        self.wait_times.append(wait)
+        metrics.observe("sandbox_queue_wait", None, wait)
+        replace = False
+        streamed = []
+
+        try:
+            worker.conn.send((code, tests, max_steps))
+            worker.runs += 1
+            deadline = time.monotonic() + timeout
+
+            while True:
+                if not worker.conn.poll(max(deadline - time.monotonic(), 0)):
+                    # Hard kill: the worker is replaced, the runaway code dies with it
+                    result["output"] = "".join(streamed)
+                    result["timeout"] = True
+                    replace = True
+                    break
+
+                kind, payload = worker.conn.recv()
+                if kind in ("result", "stopped"):
+                    result = payload
+                    replace = kind == "stopped"
+                    break
+
+                streamed.append(payload)
+                if on_output:
+                    on_output(payload)
+        except (EOFError, OSError):
+            # Worker died mid-run, most likely after hitting a resource limit
+            result["error"] = TERMINATED_ERROR
+            replace = True
+
+        if replace or worker.runs >= self.max_runs:
+            if replace:
+                worker.kill()
+            else:
+                worker.stop()
+            worker = self._spawn()
+
+        if self._closed:
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+        return result
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Shared pool, started on first use
+def get_sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+            pool = _pool
+            metrics.gauge("sandbox_queue_depth", lambda: pool.queued)
+            metrics.gauge("sandbox_idle_workers", lambda: pool._idle.qsize())
+        return _pool
+
+def shutdown_sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+# Fork server: a small, separately started interpreter that has already
+# imported the common modules and forks a fresh copy-on-write child per
+# submission. Every run gets a clean process and its own resource limits
+# without paying for interpreter start-up. It is not forked from the app, so
+# children don't inherit the app's memory, threads or open files.
+
+def _fork_server_entry(argv):
+    fd, cpu_seconds, memory_limit, max_output_chars, max_output_lines = map(int, argv[:5])
+    preload = argv[5].split(",") if len(argv) > 5 and argv[5] else ()
+    conn = multiprocessing.connection.Connection(fd)
+    _fork_server_main(conn, cpu_seconds, memory_limit, max_output_chars, max_output_lines, preload)
+
+# Server loop. Requests from the app are ("run", job_id, code, tests, max_steps, requested)
+# and ("kill", job_id); child messages are forwarded as (kind, job_id, payload),
+# followed by ("exit", job_id, status) once the child is gone.
+def _fork_server_main(conn, cpu_seconds, memory_limit, max_output_chars, max_output_lines, preload):
+    for name in preload:
+        importlib.import_module(name)
+    sys.addaudithook(_guard_step_counter)  # inherited by every child
+
+    children = {}  # reader connection -> (job_id, pid)
+    pids = {}  # job_id -> pid
+
+    while True:
+        try:
+            ready = multiprocessing.connection.wait([conn, *children])
+        except OSError:
+            break
+
+        if conn in ready:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+            if request is None:
+                break
+
+            if request[0] == "kill":
+                pid = pids.get(request[1])
+                if pid is not None:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            else:
+                _, job_id, code, tests, max_steps, requested = request
+                reader, writer = multiprocessing.Pipe(duplex=False)
+                pid = os.fork()
+                if pid == 0:
+                    # Child: drop every descriptor except stdio and its own writer
+                    fd = writer.fileno()
+                    os.closerange(3, fd)
+                    os.closerange(fd + 1, os.sysconf("SC_OPEN_MAX"))
+                    _fork_child_main(writer, code, tests, max_steps, requested, cpu_seconds,
+                                     memory_limit, max_output_chars, max_output_lines)
+                writer.close()
+                children[reader] = (job_id, pid)
+                pids[job_id] = pid
+
+        for reader in ready:
+            if reader is conn:
+                continue
+            job_id, pid = children[reader]
+            try:
+                kind, payload = reader.recv()
+                conn.send((kind, job_id, payload))
+                continue
+            except (EOFError, OSError):
+                pass
+
+            reader.close()
+            del children[reader]
+            del pids[job_id]
+            _, status = os.waitpid(pid, 0)
+            conn.send(("exit", job_id, status))
+
+    for job_id, pid in pids.items():
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+
+def _fork_child_main(conn, code, tests, max_steps, requested, cpu_seconds, memory_limit,
+                     max_output_chars, max_output_lines):
+    try:
+        conn.send(("spawned", time.monotonic() - requested))
+        _limit_cpu(cpu_seconds)
+        _limit_memory(memory_limit)
+
+        def send_chunk(chunk):
+            conn.send(("output", chunk))
+
+        buffer = OutputBuffer(max_output_chars, send_chunk, max_output_lines)
+        conn.send(("result", _execute(code, buffer, tests, max_steps, functools.partial(_send_and_exit, conn))))
+        conn.close()
+        os._exit(0)
+    finally:
+        os._exit(1)
+
+class ForkServer:
+    def __init__(self, max_children=FORK_MAX_CHILDREN, cpu_seconds=CPU_SECONDS,
+                 memory_limit=MEMORY_LIMIT, max_output_chars=MAX_OUTPUT_CHARS,
+                 max_output_lines=MAX_OUTPUT_LINES, preload=PRELOAD_MODULES):
+        self.process, self.conn = _launch(
+            "_fork_server_entry", cpu_seconds, memory_limit or 0, max_output_chars, max_output_lines,
+            ",".join(preload),
+        )
+        self.alive = True
+        self.max_children = max_children
+        self.active = 0  # children currently running
+        self.queued = 0  # runs waiting for a free slot
+        self.wait_times = deque(maxlen=WAIT_SAMPLES)  # seconds spent waiting for a free slot
+        self.spawn_times = deque(maxlen=WAIT_SAMPLES)  # seconds from request to running child
+        self._slots = threading.BoundedSemaphore(max_children)
+        self._jobs = {}  # job_id -> queue of (kind, payload)
+        self._job_ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name="sandbox-fork-reader", daemon=True)
+        self._reader.start()
+
+    # Route the server's messages to the runs waiting for them
+    def _read(self):
+        while True:
+            try:
+                kind, job_id, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.put((kind, payload))
+
+        self.alive = False
+        for job in list(self._jobs.values()):
+            job.put(("exit", None))
+
+    def _send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    # submitted as for SandboxPool.run
+    def run(self, code, timeout=5, on_output=None, tests=None, max_steps=None, submitted=None):
+        result = {"output": "", "error": None, "timeout": False}
+        queued = submitted or time.monotonic()
+        if submitted is None:
+            self.queued += 1
+        self._slots.acquire()
+        self.queued -= 1
+        wait = time.monotonic() - queued
+        self.wait_times.append(wait)
+        metrics.observe("sandbox_queue_wait", None, wait)
+
+        job_id = next(self._job_ids)
+        job = self._jobs[job_id] = queue.Queue()
+        streamed = []
+        self.active += 1
+
+        try:
+            self._send(("run", job_id, code, tests, max_steps, time.monotonic()))
+            deadline = time.monotonic() + timeout
+
+            while True:
+                try:
+                    kind, payload = job.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    # Hard kill: the child dies, the server and other runs carry on
+                    self._send(("kill", job_id))
+                    result["output"] = "".join(streamed)
+                    result["timeout"] = True
+                    break
+
+                if kind == "spawned":
+                    self.spawn_times.append(payload)
+                    metrics.observe("sandbox_spawn", None, payload)
+                elif kind == "output":
+                    streamed.append(payload)
+                    if on_output:
+                        on_output(payload)
+                elif kind in ("result", "stopped"):
+                    result = payload
+                    break
+                else:
+                    # Child exited without a result, most likely after hitting a resource limit
+                    result["error"] = TERMINATED_ERROR
+                    break
+        except (OSError, ValueError):
+            result["error"] = TERMINATED_ERROR
+        finally:
+            del self._jobs[job_id]
+            self.active -= 1
+            self._slots.release()
+
+        return result
+
+    # Spawn latency summary in milliseconds
+    def stats(self):
+        spawns = sorted(self.spawn_times)
+        if not spawns:
+            return {"runs": 0}
+        return {
+            "runs": len(spawns),
+            "spawn_ms_p50": round(spawns[len(spawns) // 2] * 1000, 3),
+            "spawn_ms_p99": round(spawns[min(int(len(spawns) * 0.99), len(spawns) - 1)] * 1000, 3),
+            "spawn_ms_mean": round(sum(spawns) / len(spawns) * 1000, 3),
+        }
+
+    def shutdown(self):
+        try:
+            self._send(None)
+        except (OSError, ValueError):
+            pass
+        try:
+            self.process.wait(1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
+
+_fork_server = None
+
+# Shared fork server, started on first use and restarted if it died;
+# None where os.fork is unavailable
+def get_fork_server():
+    global _fork_server
+    if not hasattr(os, "fork"):
+        return None
+    with _pool_lock:
+        if _fork_server is not None and not _fork_server.alive:
+            _fork_server.shutdown()
+            _fork_server = None
+        if _fork_server is None:
+            _fork_server = ForkServer()
+            server = _fork_server
+            metrics.gauge("sandbox_fork_active", lambda: server.active)
+            metrics.gauge("sandbox_fork_queued", lambda: server.queued)
+        return _fork_server
+
+def shutdown_fork_server():
+    global _fork_server
+    with _pool_lock:
+        if _fork_server is not None:
+            _fork_server.shutdown()
+            _fork_server = None
+
+# Backend used for EXECUTION_MODE: the fork server where possible, else the worker pool
+def get_runner(mode=None):
+    if (mode or EXECUTION_MODE) == "fork":
+        server = get_fork_server()
+        if server is not None:
+            return server
+    return get_sandbox_pool()
+
+# Runs the backend can take at once
+def runner_concurrency(mode=None):
+    if (mode or EXECUTION_MODE) == "thread":
+        return FORK_MAX_CHILDREN  # no limit of its own; matches the fork server
+    runner = get_runner(mode)
+    return getattr(runner, "max_children", None) or runner.size
+
+_run_executors = {}  # mode -> executor whose threads wait on runs for run_code_async
+
+# Threads for run_code_async, one per run the backend can take at once. A
+# run blocks its thread until it finishes, so these are kept apart from the
+# loop's shared default executor; runs beyond the backend's limit queue here
+def _run_executor(mode):
+    concurrency = runner_concurrency(mode)
+    with _pool_lock:
+        executor = _run_executors.get(mode)
+        if executor is None:
+            executor = _run_executors[mode] = ThreadPoolExecutor(
+                concurrency, thread_name_prefix=f"sandbox-{mode}"
+            )
+        return executor
+
+def shutdown_runners():
+    with _pool_lock:
+        executors = list(_run_executors.values())
+        _run_executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False)
+    shutdown_fork_server()
+    shutdown_sandbox_pool()
+
+# LRU cache of compiled submissions and their deterministic results,
+# keyed on (task id, code hash)
+class RunCache:
+    def __init__(self, max_entries=RUN_CACHE_ENTRIES, max_bytes=RUN_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(task_id, code):
+        return (task_id, hashlib.sha256(code.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    def _entry_size(entry):
+        size = len(entry.get("compiled") or b"")
+        if entry.get("result"):
+            size += len(entry["result"]["output"]) + len(entry["result"]["error"] or "")
+        return size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, compiled, result=None, passed=None):
+        entry = {"compiled": compiled, "result": result, "passed": passed}
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= self._entry_size(old)
+            self._entries[key] = entry
+            self.size += self._entry_size(entry)
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self.size > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self._entry_size(evicted)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+# A result is worth caching only if it doesn't depend on server load
+def is_deterministic_result(result):
+    return (
+        not result["timeout"] and result["error"] != TERMINATED_ERROR
+        and not any(case["status"] == "timeout" for case in result.get("tests") or ())
+        and "complexity" not in result  # timings always depend on load
+    )
+
+# Entry point used by the app; tests (see _run_cases) are run in the same
+# invocation, max_steps sets a deterministic line budget (see _StepCounter)
+def run_code(code, timeout=5, mode=None, on_output=None, tests=None, max_steps=None, submitted=None):
+    mode = mode or EXECUTION_MODE
+    with metrics.timer("code_execution", mode):
+        if mode == "thread":
+            result = run_in_thread(code, timeout, on_output, tests, max_steps)
+        else:
+            result = get_runner(mode).run(code, timeout, on_output, tests, max_steps, submitted)
+
+    if result["timeout"]:
+        metrics.increment("sandbox_timeouts", mode)
+    elif result["error"] == TERMINATED_ERROR:
+        metrics.increment("sandbox_terminated", mode)
+    return result
+
+# Awaitable version of run_code; on_output is called on the event loop.
+# Queue wait and depth count from here, including time spent waiting for a
+# thread of the run executor
+async def run_code_async(code, timeout=5, mode=None, on_output=None, tests=None, max_steps=None):
+    loop = asyncio.get_running_loop()
+    mode = mode or EXECUTION_MODE
+    forward = None
+    if on_output:
+        def forward(chunk):
+            loop.call_soon_threadsafe(on_output, chunk)
+
+    executor = _run_executor(mode)
+    submitted = None
+    if mode != "thread":
+        submitted = time.monotonic()
+        get_runner(mode).queued += 1
+    return await loop.run_in_executor(
+        executor, functools.partial(run_code, code, timeout, mode, forward, tests, max_steps, submitted)
+    )
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+# python_master creates data/ under the working directory and opens its
+# database there on import, so the app is imported from a scratch directory
+# that stays current for the whole session
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    import python_master
+    yield python_master
+    python_master.progress_writer.flush()
+    os.chdir(cwd)
@@ -0,0 +1,184 @@
+import math
+from contextlib import nullcontext
+
+import pytest
+
+import complexity
+import sandbox
+from complexity import SizeTimeout, fit_complexity, grade_complexity, growth_exponent, meets_target
+
+SIZES = [1000, 4000, 16000, 64000, 256000]
+
+BINARY_SEARCH = """
+def search(arr, target):
+    lo, hi = 0, len(arr) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if arr[mid] == target:
+            return mid
+        if arr[mid] < target:
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return -1
+"""
+
+LINEAR_SEARCH = """
+def search(arr, target):
+    for i, value in enumerate(arr):
+        if value == target:
+            return i
+    return -1
+"""
+
+QUADRATIC = """
+def search(arr, target):
+    for a in arr:
+        for b in arr:
+            pass
+    return -1
+"""
+
+LINEAR_SUM = """
+def search(arr, target):
+    total = 0
+    for value in arr:
+        total += value
+    return -1
+"""
+
+def no_timer(seconds):
+    return nullcontext()
+
+def define(source):
+    namespace = {}
+    exec(source, namespace)
+    return namespace["search"]
+
+def spec(target, sizes=SIZES[:4]):
+    return {"input": "sorted_list_missing_target", "sizes": sizes, "target": target, "repeat": 3}
+
+def test_growth_exponent_of_a_power_law():
+    assert growth_exponent(SIZES, [n ** 2 for n in SIZES]) == pytest.approx(2)
+    assert growth_exponent(SIZES, [7.0] * len(SIZES)) == pytest.approx(0)
+
+@pytest.mark.parametrize("name, growth", complexity.COMPLEXITY_CLASSES)
+def test_fit_picks_the_generating_class(name, growth):
+    exponent, fits = fit_complexity(SIZES, [3e-9 * growth(n) for n in SIZES])
+
+    assert fits[0][0] == name
+    assert fits[0][1] == pytest.approx(0, abs=1e-9)
+
+def test_fit_ignores_constant_factors():
+    slow = fit_complexity(SIZES, [1e-3 * math.log2(n) for n in SIZES])
+    fast = fit_complexity(SIZES, [1e-9 * math.log2(n) for n in SIZES])
+
+    assert slow[1][0][0] == fast[1][0][0] == "O(log n)"
+
+def test_fit_sees_growth_through_call_overhead():
+    _, fits = fit_complexity(SIZES, [5e-6 + 1e-9 * n for n in SIZES])
+
+    assert fits[0][0] == "O(n)"
+
+def test_binary_search_meets_a_logarithmic_target():
+    report = grade_complexity(define(BINARY_SEARCH), spec("O(log n)"), no_timer)
+
+    assert report["passed"], report
+    assert report["fitted"] in ("O(1)", "O(log n)")
+    assert [size["status"] for size in report["sizes"]] == ["ok"] * 4
+    assert all(size["seconds"] > 0 and size["peak_bytes"] >= 0 for size in report["sizes"])
+
+def test_linear_search_misses_a_logarithmic_target():
+    report = grade_complexity(define(LINEAR_SEARCH), spec("O(log n)"), no_timer)
+
+    assert not report["passed"]
+    assert report["fitted"] == "O(n)"
+    assert report["reason"] == "Grows like O(n), expected O(log n)"
+
+def test_size_timeout_stops_the_measurement():
+    def search(arr, target):
+        # Stands in for the alarm going off during a call
+        if len(arr) >= 16000:
+            raise SizeTimeout()
+        return -1
+
+    report = grade_complexity(search, spec("O(n)"), no_timer)
+
+    assert not report["passed"]
+    assert report["fitted"] is None
+    assert report["reason"] == "Too slow at n=16,000"
+    assert [size["status"] for size in report["sizes"]] == ["ok", "ok", "timeout"]
+
+def test_time_limit_is_per_call():
+    limits = []
+
+    def timer(seconds):
+        limits.append(seconds)
+        return nullcontext()
+
+    grade_complexity(define(LINEAR_SEARCH), spec("O(n)"), timer)
+
+    memory_limit = complexity.CALL_TIME_LIMIT * complexity.TRACEMALLOC_SLOWDOWN
+    # Every size is sampled repeat times and then measured for memory once
+    assert limits.count(memory_limit) == 4
+    loops = [limit / complexity.CALL_TIME_LIMIT for limit in limits if limit != memory_limit]
+    assert len(loops) >= 4 * 3
+    assert all(count == pytest.approx(round(count)) and count >= 1 for count in loops)
+
+def test_linear_loop_meets_a_linear_target():
+    report = grade_complexity(define(LINEAR_SUM), spec("O(n)", sizes=SIZES), no_timer)
+
+    assert report["passed"], report
+
+def test_target_allows_exponent_noise_but_not_a_worse_class():
+    sizes = SIZES[:4]
+    n_log_n = growth_exponent(sizes, [n * math.log2(n) for n in sizes])
+    quadratic = growth_exponent(sizes, [n * n for n in sizes])
+
+    assert meets_target(sizes, n_log_n, "O(n)")
+    assert not meets_target(sizes, quadratic, "O(n)")
+    assert not meets_target(sizes, 1.0, "O(log n)")
+
+def test_too_few_sizes_are_not_fitted():
+    report = grade_complexity(define(LINEAR_SEARCH), spec("O(n)", sizes=[100, 200]), no_timer)
+
+    assert not report["passed"]
+    assert report["reason"] == "Not enough sizes to fit a curve"
+
+def test_unknown_target_is_rejected():
+    with pytest.raises(ValueError):
+        grade_complexity(define(LINEAR_SEARCH), spec("O(n^3)"), no_timer)
+
+@pytest.mark.skipif(not sandbox._can_alarm(), reason="needs SIGALRM in the main thread")
+def test_sandbox_alarm_cuts_off_a_slow_size(monkeypatch):
+    monkeypatch.setattr(complexity, "CALL_TIME_LIMIT", 0.05)
+    result = sandbox._execute(QUADRATIC, tests={
+        "function": "search",
+        "cases": [{"args": [[1, 3], 2], "expected": -1}],
+        "complexity": spec("O(log n)"),
+    })
+
+    assert result["error"] is None
+    assert result["complexity"]["passed"] is False
+    assert result["complexity"]["sizes"][-1]["status"] == "timeout"
+    assert result["complexity"]["reason"].startswith("Too slow at n=")
+
+def test_complexity_is_skipped_when_a_case_fails():
+    result = sandbox._execute(LINEAR_SEARCH, tests={
+        "function": "search",
+        "cases": [{"args": [[1, 3], 3], "expected": 0}],
+        "complexity": spec("O(log n)"),
+    })
+
+    assert [case["status"] for case in result["tests"]] == ["failed"]
+    assert "complexity" not in result
+
+def test_is_passing_needs_the_complexity_target(app):
+    task = {"function": "search", "tests": [{"args": [[1, 3], 3], "expected": 1}], "complexity": spec("O(log n)")}
+    result = sandbox._execute(BINARY_SEARCH, tests=app.task_tests(task))
+
+    assert app.is_passing(task, result) == result["complexity"]["passed"]
+    result["complexity"]["passed"] = False
+    assert not app.is_passing(task, result)
+    del result["complexity"]
+    assert not app.is_passing(task, result)
@@ -0,0 +1,92 @@
+import pytest
+
+from quiz_engine import (
+    NO_ANSWER,
+    QuizAttempt,
+    draw_questions,
+    grade_answers,
+    grade_attempt,
+    load_responses,
+    save_attempt,
+)
+
+QUIZ = {
+    "id": "quiz1",
+    "draw": 3,
+    "questions": [
+        {"question": f"Question {i}", "options": ["a", "b", "c"], "correct": i % 3}
+        for i in range(6)
+    ],
+}
+
+@pytest.fixture
+def pool(app, tmp_path):
+    pool = app.ConnectionPool(str(tmp_path / "quiz.db"))
+    app._migrate_quiz_attempts(pool)
+    yield pool
+    pool.close()
+
+def answer_all(attempt, answers):
+    for position, answer in enumerate(answers):
+        attempt.answer(position, answer)
+
+def test_draw_is_reproducible_from_the_seed():
+    assert draw_questions(10, 4, seed=7) == draw_questions(10, 4, seed=7)
+    assert len(set(draw_questions(10, 4, seed=7))) == 4
+
+def test_draw_larger_than_the_pool_asks_every_question():
+    assert sorted(draw_questions(5, 8, seed=1)) == list(range(5))
+    assert sorted(draw_questions(5, None, seed=1)) == list(range(5))
+
+def test_attempt_draws_questions_and_key_from_its_seed():
+    attempt = QuizAttempt(QUIZ, user_id=1, seed=42)
+    again = QuizAttempt(QUIZ, user_id=1, seed=42)
+
+    assert attempt.question_indices == again.question_indices
+    assert len(attempt.questions) == QUIZ["draw"]
+    assert attempt.key == [QUIZ["questions"][i]["correct"] for i in attempt.question_indices]
+    assert attempt.answers == [NO_ANSWER] * QUIZ["draw"]
+
+def test_grade_answers():
+    grade = grade_answers([0, 2, 1, NO_ANSWER], [0, 1, 1, 2])
+
+    assert grade["results"] == [True, False, True, False]
+    assert grade["correct_count"] == 2
+    assert grade["score"] == 50
+
+def test_grade_answers_without_questions():
+    assert grade_answers([], [])["score"] == 0
+
+def test_save_attempt_round_trips_responses(pool):
+    attempt = QuizAttempt(QUIZ, user_id=3, seed=5)
+    answers = [attempt.key[0], (attempt.key[1] + 1) % 3, attempt.key[2]]
+    answer_all(attempt, answers)
+
+    attempt_id = save_attempt(pool, attempt)
+
+    assert attempt_id == attempt.id
+    assert load_responses(pool, attempt_id) == [
+        (position, question_index, answer, int(correct))
+        for position, (question_index, answer, correct) in enumerate(
+            zip(attempt.question_indices, answers, [True, False, True])
+        )
+    ]
+    with pool.connection() as conn:
+        row = conn.execute(
+            "SELECT user_id, quiz_id, seed, score, correct_count, question_count FROM quiz_attempts WHERE id = ?",
+            (attempt_id,)
+        ).fetchone()
+    assert row == (3, "quiz1", 5, 66, 2, 3)
+
+def test_progress_writer_stores_the_attempt_with_the_completion(app):
+    user = app.UserSession(4, "learner4").load()
+    attempt = QuizAttempt(QUIZ, user.id, seed=9)
+    answer_all(attempt, attempt.key)
+    grade = grade_attempt(attempt)
+
+    app.progress_writer.submit(user.id, "quiz", QUIZ["id"], points=15, score=grade["score"], attempt=(attempt, grade))
+    app.progress_writer.flush()
+
+    assert attempt.id is not None
+    assert [row[2] for row in load_responses(app.db_pool, attempt.id)] == attempt.key
+    assert QUIZ["id"] in app.get_completion_set(user.id, "quiz")
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import sandbox
+from sandbox import STEP_LIMIT_ERROR, _execute, run_code
+
+MODES = ["thread", "process"] + (["fork"] if hasattr(os, "fork") else [])
+SUBPROCESS_MODES = MODES[1:]  # modes that guard the step counter
+
+SOURCE = """
+def pair(a, b):
+    return (a, b)
+
+def divide(a, b):
+    return a / b
+
+def spin(n):
+    while True:
+        pass
+"""
+
+@pytest.fixture(scope="module", autouse=True)
+def runners():
+    yield
+    sandbox.shutdown_runners()
+
+def case_spec(function, cases, fail_fast=True):
+    return {"function": function, "cases": cases, "fail_fast": fail_fast}
+
+def statuses(result):
+    return [case["status"] for case in result["tests"]]
+
+def test_tuples_and_lists_compare_equal():
+    result = _execute(SOURCE, tests=case_spec("pair", [
+        {"args": [1, 2], "expected": [1, 2]},
+        {"args": [[1, (2, 3)], {"k": (4,)}], "expected": [[1, [2, 3]], {"k": [4]}]},
+    ]))
+
+    assert result["error"] is None
+    assert statuses(result) == ["passed", "passed"]
+    assert result["tests"][0]["actual"] == "(1, 2)"
+
+def test_failed_case_reports_expected_value_and_skips_the_rest():
+    result = _execute(SOURCE, tests=case_spec("divide", [
+        {"name": "halves", "args": [1, 2], "expected": 0.5},
+        {"args": [1, 4], "expected": 0.5},
+        {"args": [1, 8], "expected": 0.125},
+    ]))
+
+    assert statuses(result) == ["passed", "failed", "skipped"]
+    assert result["tests"][0]["name"] == "halves"
+    assert result["tests"][1]["name"] == "Case 2"
+    assert result["tests"][1]["expected"] == "0.5"
+    assert result["tests"][1]["actual"] == "0.25"
+
+def test_without_fail_fast_every_case_runs():
+    result = _execute(SOURCE, tests=case_spec("divide", [
+        {"args": [1, 0], "expected": 0},
+        {"args": [1, 8], "expected": 0.125},
+    ], fail_fast=False))
+
+    assert statuses(result) == ["error", "passed"]
+    assert result["tests"][0]["error"] == "ZeroDivisionError: division by zero"
+
+def test_missing_function_is_an_error():
+    result = _execute(SOURCE, tests=case_spec("missing", [{"args": [], "expected": None}]))
+
+    assert result["error"] == "Function missing is not defined"
+    assert result["tests"] == []
+
+@pytest.mark.skipif(not sandbox._can_alarm(), reason="needs SIGALRM in the main thread")
+def test_case_over_its_time_limit_times_out():
+    result = _execute(SOURCE, tests=case_spec("spin", [
+        {"args": [1], "expected": None, "timeout": 0.1},
+        {"args": [2], "expected": None},
+    ]))
+
+    assert result["error"] is None
+    assert statuses(result) == ["timeout", "skipped"]
+
+def test_cases_run_in_thread_mode():
+    result = run_code(SOURCE, mode="thread", tests=case_spec("divide", [
+        {"args": [6, 3], "expected": 2},
+        {"args": [1, 0], "expected": 0},
+    ]))
+
+    assert not result["timeout"]
+    assert statuses(result) == ["passed", "error"]
+
+def test_is_passing_needs_every_case_to_pass(app):
+    task = {"function": "divide", "tests": [
+        {"args": [6, 3], "expected": 2},
+        {"args": [1, 4], "expected": 0.25},
+    ]}
+    passing = _execute(SOURCE, tests=app.task_tests(task))
+    failing = _execute(SOURCE.replace("a / b", "a // b"), tests=app.task_tests(task))
+
+    assert app.is_passing(task, passing)
+    assert not app.is_passing(task, failing)
+    # A result that ran fewer cases than the task has never passes
+    assert not app.is_passing(task, dict(passing, tests=passing["tests"][:1]))
+
+def test_is_passing_compares_output_for_tasks_without_cases(app):
+    task = {"validation": "4\n"}
+
+    assert app.task_tests(task) is None
+    assert app.is_passing(task, _execute("print(2 + 2)"))
+    assert not app.is_passing(task, _execute("print(2 + 3)"))
+    assert not app.is_passing(task, {"output": "4", "error": None, "timeout": True})
+
+@pytest.mark.parametrize("code, error", [
+    ("-" * 100000 + "1", None),
+    ("a" + ".b" * 100000, "maximum recursion depth exceeded during compilation"),
+    ("print(", "'(' was never closed (<submission>, line 1)"),
+], ids=["unary-chain", "attribute-chain", "syntax-error"])
+def test_submission_that_fails_to_compile_is_a_cached_error(app, code, error):
+    task = {"id": "compile-failure", "validation": ""}
+
+    result, passed = asyncio.run(app.run_task_submission(task, code))
+
+    assert not passed
+    assert result["error"] and (error is None or result["error"] == error)
+    assert app.RUN_CACHE.get(app.RUN_CACHE.key(task["id"], code))["result"] == result
+
+# The submission catches the stop and would otherwise keep looping until
+# the wall-clock timeout; the loops are bounded so an abandoned thread-mode
+# run ends on its own
+CATCH_ALL_LOOPS = [
+    "try:\n    while True: pass\nexcept BaseException:\n    pass",
+    "import time\nend = time.monotonic() + 3\nwhile time.monotonic() < end:\n    try:\n        pass\n    except:\n        pass",
+]
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("code", CATCH_ALL_LOOPS)
+def test_step_limit_cannot_be_caught(mode, code):
+    start = time.monotonic()
+    result = run_code(code, timeout=2, mode=mode, max_steps=50)
+
+    assert not result["timeout"]
+    assert result["error"] == f"{STEP_LIMIT_ERROR} (50 steps)"
+    assert result["steps"] == 50
+    assert time.monotonic() - start < 1.5
+
+@pytest.mark.parametrize("mode", MODES)
+def test_step_limit_marks_the_running_case(mode):
+    code = "import time\ndef spin(n):\n    end = time.monotonic() + 3\n    while time.monotonic() < end:\n        try:\n            n += 1\n        except BaseException:\n            pass\n    return n"
+    result = run_code(code, timeout=2, mode=mode, max_steps=50, tests=case_spec("spin", [
+        {"args": [1], "expected": 1},
+        {"args": [2], "expected": 2},
+    ]))
+
+    assert result["error"] == f"{STEP_LIMIT_ERROR} (50 steps)"
+    assert result["tests"] == [{"name": "Case 1", "status": "error", "error": STEP_LIMIT_ERROR}]
+
+@pytest.mark.parametrize("mode", MODES)
+def test_runner_keeps_working_after_a_step_limit_stop(mode):
+    run_code("while True: pass", timeout=2, mode=mode, max_steps=10)
+    result = run_code("print('ok')", timeout=2, mode=mode, max_steps=10)
+
+    assert result == {"output": "ok\n", "error": None, "timeout": False, "steps": 1}
+
+@pytest.mark.parametrize("mode", SUBPROCESS_MODES)
+@pytest.mark.parametrize("call", ["sys.settrace(None)", "sys.setprofile(None)"])
+def test_step_counter_cannot_be_switched_off(mode, call):
+    code = f"import sys\ntry:\n    {call}\nexcept RuntimeError as e:\n    print(e)\nfor i in range(1000000):\n    pass"
+    result = run_code(code, timeout=2, mode=mode, max_steps=100)
+
+    assert result["output"] == f"{call.split('(')[0]}() is not allowed while steps are counted\n"
+    assert result["error"] == f"{STEP_LIMIT_ERROR} (100 steps)"
+
+@pytest.mark.parametrize("mode", SUBPROCESS_MODES)
+def test_test_function_cannot_switch_the_counter_off(mode):
+    code = "import sys\ndef spin(n):\n    sys.settrace(None)\n    for i in range(n):\n        pass\n    return n"
+    result = run_code(code, timeout=2, mode=mode, max_steps=20, tests=case_spec("spin", [
+        {"args": [100000], "expected": 100000},
+    ]))
+
+    assert result["tests"] == [{
+        "name": "Case 1",
+        "status": "error",
+        "error": "RuntimeError: sys.settrace() is not allowed while steps are counted",
+    }]
+
+def test_tracing_is_allowed_without_a_budget():
+    result = run_code("import sys\nsys.settrace(None)\nprint('ok')", timeout=2)
+
+    assert result["error"] is None
+    assert result["output"] == "ok\n"